@@ -1,15 +1,27 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import json
+import math
 import random
 import os
 from collections import defaultdict
-import firebase_admin
-from firebase_admin import credentials, firestore
 from dotenv import load_dotenv
 import boto3
+from botocore.config import Config
 from datetime import datetime
 import requests
+import atexit
+from user_overlays import UserOverlayStore
+from stats_store import StatsFileLoader
+from firestore_stats import FirestoreStatsBackend
+from catalog import Catalog
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from firestore_utils import init_firestore, valid_document_id
+from profiling import RequestProfiler
+from scoring import context_to_key, rank_stats, rank_titles, supplement_titles
+from precomputed import PrecomputedStore
+from single_flight import SingleFlight
+from sentiment import SentimentModel, load_weights
 
 # Load environment variables from .env file
 load_dotenv()
@@ -19,19 +31,43 @@ app = Flask(__name__, static_folder='.', static_url_path='')
 # Be more explicit with CORS to allow all origins for all routes
 CORS(app, resources={r"/*": {"origins": "*"}})
 
+# ✅ On-demand profiling (/admin/profiling/*) - only wired up when an admin token is set
+PROFILING_ADMIN_TOKEN = os.getenv('PROFILING_ADMIN_TOKEN')
+profiler = RequestProfiler(app, admin_token=PROFILING_ADMIN_TOKEN) if PROFILING_ADMIN_TOKEN else None
+
 # ✅ Paths
 script_dir = os.path.dirname(__file__)
 training_path = os.path.join(script_dir, "../data/training_data_bandit.json")
 bandit_stats_path = os.path.join(script_dir, "../data/bandit_stats.json")
+# Written by ml_scripts/compact_bandit_stats.py; used instead of bandit_stats.json while it is newer
+compact_stats_path = os.path.join(script_dir, "../data/bandit_stats.compact.json")
 cred_path = os.path.join(script_dir, "serviceAccountKey.json")
 
-# ✅ Firebase init
+# ✅ Circuit breakers for external dependencies - when one is open we skip
+# straight to the local fallback instead of waiting on a struggling upstream
+WEATHER_API_URL = os.getenv('WEATHER_API_URL', 'https://wttr.in').rstrip('/')
+WEATHER_TIMEOUT_SECONDS = float(os.getenv('WEATHER_TIMEOUT_SECONDS', '2'))
+COMPREHEND_TIMEOUT_SECONDS = float(os.getenv('COMPREHEND_TIMEOUT_SECONDS', '2'))
+FIRESTORE_TIMEOUT_SECONDS = float(os.getenv('FIRESTORE_TIMEOUT_SECONDS', '2'))
+breakers = {
+    "weather": CircuitBreaker("weather", slow_call_seconds=WEATHER_TIMEOUT_SECONDS),
+    "comprehend": CircuitBreaker("comprehend", slow_call_seconds=COMPREHEND_TIMEOUT_SECONDS),
+    "firestore": CircuitBreaker("firestore", slow_call_seconds=FIRESTORE_TIMEOUT_SECONDS),
+}
+
+# ✅ Single-flight coalescing: concurrent identical work runs once and is shared
+context_rankings = SingleFlight("context_rankings")
+sentiment_lookups = SingleFlight("sentiment")
+weather_lookups = SingleFlight("weather")
+
+# ✅ Firebase init (FIREBASE_DISABLED=1 runs without Firestore, e.g. load tests)
 db = None
-if not firebase_admin._apps:
+if os.getenv('FIREBASE_DISABLED', '0') == '1':
+    print("Firebase disabled by FIREBASE_DISABLED=1; running without Firestore")
+else:
     try:
-        cred = credentials.Certificate(cred_path)
-        firebase_admin.initialize_app(cred)
-        db = firestore.client()
+        # Local/test runs talk to the Firestore emulator (FIRESTORE_EMULATOR_HOST), which needs no key
+        db = init_firestore(cred_path)
     except Exception as e:
         print(f"Warning: Firebase initialization failed: {e}")
         print("Running in local mode without Firebase connectivity")
@@ -42,13 +78,55 @@ try:
         'comprehend',
         aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
         aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-        region_name=os.getenv('AWS_REGION')
+        region_name=os.getenv('AWS_REGION'),
+        # Lets local/load-test runs point at a stand-in Comprehend endpoint
+        endpoint_url=os.getenv('COMPREHEND_ENDPOINT_URL') or None,
+        config=Config(
+            connect_timeout=COMPREHEND_TIMEOUT_SECONDS,
+            read_timeout=COMPREHEND_TIMEOUT_SECONDS,
+            # total_max_attempts counts the first call too (max_attempts counts retries): no retry,
+            # so a hung call can't outlast the timeout the breaker assumes
+            retries={'total_max_attempts': 1}
+        )
     )
     print("✅ AWS Comprehend client initialized successfully.")
 except Exception as e:
     comprehend = None
     print(f"⚠️ Warning: AWS Comprehend initialization failed: {e}")
-    print("Sentiment analysis will be unavailable.")
+    print("Sentiment analysis will use the local model only.")
+
+# ✅ Local sentiment model: SENTIMENT_MODE=comprehend (local model only as fallback),
+# prefilter (Comprehend only below the confidence threshold) or local (never Comprehend)
+SENTIMENT_MODE = os.getenv('SENTIMENT_MODE', 'comprehend')
+SENTIMENT_CONFIDENCE_THRESHOLD = float(os.getenv('SENTIMENT_CONFIDENCE_THRESHOLD', '0.8'))
+# In prefilter mode this share of confident texts still goes to Comprehend, so the stored
+# labels (mood_source "comprehend_audit") also cover the texts the model answers itself
+SENTIMENT_AUDIT_RATE = float(os.getenv('SENTIMENT_AUDIT_RATE', '0.02'))
+# Weights fitted by ml_scripts/benchmark_sentiment.py --fit --save-weights (default: hand-set)
+sentiment_model = SentimentModel(weights=load_weights(os.getenv('SENTIMENT_WEIGHTS_PATH')))
+
+# ✅ Per-user personalization overlays (bounded, cold users reload from Firestore)
+USER_OVERLAY_WEIGHT = float(os.getenv('USER_OVERLAY_WEIGHT', '2.0'))
+user_overlays = UserOverlayStore(
+    db=db,
+    breaker=breakers["firestore"],
+    timeout=FIRESTORE_TIMEOUT_SECONDS,
+    capacity=int(os.getenv('USER_OVERLAY_CAPACITY', '10000')),
+    ttl_seconds=float(os.getenv('USER_OVERLAY_TTL_SECONDS', '0')) or None,
+)
+atexit.register(user_overlays.stop)
+
+# ✅ Nightly precomputed per-user lists (ml_scripts/precompute_user_recommendations.py)
+# Off by default (PRECOMPUTED_RECOMMENDATIONS=1 enables it): every cache miss is a synchronous
+# Firestore read (up to FIRESTORE_TIMEOUT_SECONDS) on /recommend, fetching a list the in-memory,
+# coalesced rank_stats builds in well under that. It only pays off when ranking is the bottleneck.
+precomputed_recommendations = PrecomputedStore(
+    db=db if os.getenv('PRECOMPUTED_RECOMMENDATIONS', '0') == '1' else None,
+    breaker=breakers["firestore"],
+    timeout=FIRESTORE_TIMEOUT_SECONDS,
+    capacity=int(os.getenv('PRECOMPUTED_CACHE_CAPACITY', '50000')),
+    max_age_seconds=float(os.getenv('PRECOMPUTED_MAX_AGE_HOURS', '24')) * 3600,
+)
 
 # ✅ Keyword mapping for Intent and Sub-Intent
 INTENT_KEYWORDS = {
@@ -62,6 +140,10 @@ SUB_INTENT_KEYWORDS = {
     "Cooking": ["cook", "baking", "kitchen", "recipe", "food"]
 }
 
+def guess_weather_from_time():
+    """Local weather guess used when wttr.in is unavailable."""
+    return "Clear" if get_time_of_day() == "Night" else "Sunny"
+
 def get_weather_from_ip():
     """Fetches weather from wttr.in based on the request's IP address."""
     try:
@@ -70,22 +152,26 @@ def get_weather_from_ip():
         if ip_address == '127.0.0.1':
             # Fallback for local development
             print("Running locally, using smart fallback for weather.")
-            time_of_day = get_time_of_day()
-            if time_of_day == "Night":
-                return "Clear"
-            else:
-                return "Sunny"
-        
-        # wttr.in provides a simple JSON format
-        response = requests.get(f'https://wttr.in/{ip_address}?format=j1')
-        response.raise_for_status() # Raise an exception for bad status codes
-        weather_data = response.json()
+            return guess_weather_from_time()
         
-        # Extract the first weather description
-        return weather_data.get('current_condition', [{}])[0].get('weatherDesc', [{}])[0].get('value', 'Sunny')
-    except requests.RequestException as e:
+        # Requests from the same address at the same moment share one lookup
+        return weather_lookups.do(ip_address, fetch_weather, ip_address)
+    except CircuitOpenError:
+        return guess_weather_from_time()
+    except (requests.RequestException, ValueError) as e:
         print(f"🔥 Weather API Error: {e}")
-        return "Sunny" # Default to Sunny on API failure
+        return guess_weather_from_time()
+
+def fetch_weather(ip_address):
+    # wttr.in provides a simple JSON format
+    response = breakers["weather"].call(
+        requests.get, f'{WEATHER_API_URL}/{ip_address}?format=j1', timeout=WEATHER_TIMEOUT_SECONDS
+    )
+    response.raise_for_status() # Raise an exception for bad status codes
+    weather_data = response.json()
+    
+    # Extract the first weather description
+    return weather_data.get('current_condition', [{}])[0].get('weatherDesc', [{}])[0].get('value', 'Sunny')
 
 def get_intent_from_text(text, sub_intent_text=""):
     text_lower = text.lower().strip()
@@ -122,20 +208,36 @@ with open(training_path) as f:
     training_data = json.load(f)
 
 # ✅ Load all movies into memory once to avoid repeated file reads
-all_movies = []
+# The catalog also keeps a title lookup table and each movie's pre-encoded JSON.
+# CATALOG_COMPACT=1 stores movies as slotted records with interned tags (less RSS for big catalogs)
 movies_path = os.path.join(os.path.dirname(__file__), "../data/movies.json")
-if os.path.exists(movies_path):
-    with open(movies_path, 'r', encoding='utf-8') as f:
-        all_movies = json.load(f)
-
-# Create a lookup table for faster access
-movies_by_title = {movie['title']: movie for movie in all_movies}
-
-# Helper to convert context dict to a unique string key
-# Always use the same order of keys!
-def context_to_key(context):
-    """Convert a context dictionary to a unique string key."""
-    return f"{context.get('mood','')}|{context.get('intent','')}|{context.get('sub_intent', '')}|{context.get('weather','')}|{context.get('time_of_day','') or context.get('timeOfDay','')}"
+catalog = Catalog(movies_path, compact=os.getenv('CATALOG_COMPACT', '0') == '1')
+
+# ✅ Bandit stats are loaded once (and again only when the file changes)
+# File-backed stats fade with a half-life (0 disables decay) and are capped at a total arm budget
+BANDIT_HALF_LIFE_DAYS = float(os.getenv('BANDIT_HALF_LIFE_DAYS', '30'))
+BANDIT_MAX_ARMS = int(os.getenv('BANDIT_MAX_ARMS', '200000'))
+stats_store_kwargs = dict(
+    half_life_seconds=BANDIT_HALF_LIFE_DAYS * 86400 or None,
+    max_arms=BANDIT_MAX_ARMS or None,
+)
+# BANDIT_STATS_BACKEND=firestore shares stats across instances via the bandit_stats collection
+# (plain cumulative counters: no decay or arm budget there, see firestore_stats.py)
+if os.getenv('BANDIT_STATS_BACKEND', 'file') == 'firestore' and db:
+    stats_loader = FirestoreStatsBackend(
+        db,
+        flush_interval=float(os.getenv('BANDIT_STATS_FLUSH_SECONDS', '1')),
+        breaker=breakers["firestore"],
+        timeout=FIRESTORE_TIMEOUT_SECONDS,
+    ).start()
+    atexit.register(stats_loader.stop)
+else:
+    # Feedback is buffered and merged into a new read-only stats snapshot this often
+    stats_loader = StatsFileLoader(
+        compact_stats_path, bandit_stats_path,
+        merge_interval=float(os.getenv('BANDIT_STATS_MERGE_SECONDS', '1')),
+        **stats_store_kwargs
+    )
 
 # ✅ Fallback recommendation
 def fallback_recommendation(context):
@@ -143,23 +245,23 @@ def fallback_recommendation(context):
     target_intent = context.get('intent')
     target_sub_intent = context.get('sub_intent')
     
-    # Use the in-memory 'all_movies' list instead of reading from file
+    # Use the in-memory catalog instead of reading from file
+    all_movies = catalog.movies
     
     # First, try to filter by sub_intent if it exists
     if target_sub_intent:
-        filtered_movies = [m for m in all_movies if isinstance(m, dict) and m.get('sub_intent') == target_sub_intent]
+        filtered_movies = [m for m in all_movies if m.get('sub_intent') == target_sub_intent]
         if filtered_movies:
             return random.sample(filtered_movies, min(10, len(filtered_movies)))
 
     # If no sub_intent match, filter by main intent
     if target_intent:
-        filtered_movies = [m for m in all_movies if isinstance(m, dict) and m.get('intent') == target_intent]
+        filtered_movies = [m for m in all_movies if m.get('intent') == target_intent]
         if filtered_movies:
             return random.sample(filtered_movies, min(10, len(filtered_movies)))
     
-    # If all else fails, return a truly random sample of valid movie objects
-    valid_movies = [m for m in all_movies if isinstance(m, dict) and 'title' in m]
-    return random.sample(valid_movies, min(10, len(valid_movies)))
+    # If all else fails, return a truly random sample (the catalog only holds valid movie objects)
+    return random.sample(all_movies, min(10, len(all_movies)))
 
 def calculate_dynamic_epsilon(context_stats):
     """Calculate epsilon dynamically based on context maturity"""
@@ -192,45 +294,40 @@ def recommend_movies(context, user_id="default_user"):
     # --- Strict Sub-Intent Filtering ---
     if current_sub_intent:
         print(f"🔍 STRICT MODE: Filtering ONLY for sub_intent '{current_sub_intent}'")
-        sub_intent_movies = [m for m in all_movies if m.get('sub_intent') == current_sub_intent]
+        sub_intent_movies = [m for m in catalog.movies if m.get('sub_intent') == current_sub_intent]
         if sub_intent_movies:
             return random.sample(sub_intent_movies, min(10, len(sub_intent_movies)))
         else:
             return [] # No movies match this specific sub-intent
 
+    # Only the bandit path uses the overlay, so strict mode never pays for loading it
+    user_overlay = user_overlays.get(user_id) or {}
+
     # --- Load Bandit Statistics ---
-    if os.path.exists(bandit_stats_path):
-        with open(bandit_stats_path) as f:
-            stats = json.load(f)
-    else:
+    stats_store = stats_loader.get()
+    if stats_store is None:
         print("⚠️ No bandit_stats.json found. Using fallback.")
         return fallback_recommendation(context)
 
-    # --- Find Available Movies for Context ---
-    context_stats = stats.get(context_key, {})
-    all_titles_in_context = list(context_stats.keys())
-
-    # Use similarity search if no movies for the exact context
-    if not all_titles_in_context:
-        print("No exact match for context. Using similarity search...")
-        similar_contexts = find_similar_contexts(context_key, stats)
-        for similar_key in similar_contexts:
-            all_titles_in_context.extend(list(stats[similar_key].keys()))
-        all_titles_in_context = list(set(all_titles_in_context))
-
-    if not all_titles_in_context:
-        print("No movies found in bandit stats or similar contexts. Using fallback.")
+    # --- Shared Ranking for the Context ---
+    # Concurrent requests for the same context and stats/catalog version wait on one
+    # computation; each one still makes its own exploration draw below
+    flight_key = (context_key, getattr(stats_store, 'version', None), catalog.version)
+    ranking = context_rankings.do(flight_key, rank_context_candidates, stats_store, context_key, context)
+    if ranking is None:
+        print("No movies found in bandit stats or rollups. Using fallback.")
         return fallback_recommendation(context)
+    all_titles_in_context = ranking["titles"]
 
     # --- Epsilon-Greedy Logic ---
-    epsilon = calculate_dynamic_epsilon(context_stats)
+    epsilon = ranking["epsilon"]
     
     if random.random() < epsilon:
         # Exploration: Choose a random sample of movies from the available list
         print(f"🧭 EXPLORING with epsilon {epsilon:.2f}")
         random_titles = random.sample(all_titles_in_context, min(10, len(all_titles_in_context)))
         # Convert titles to full movie objects
-        recommendations = [movies_by_title[title] for title in random_titles if title in movies_by_title]
+        recommendations = [catalog.by_title[title] for title in random_titles if title in catalog.by_title]
         
         # Ensure we have 10 recommendations by supplementing if needed
         if len(recommendations) < 10:
@@ -243,25 +340,27 @@ def recommend_movies(context, user_id="default_user"):
         # Exploitation: Choose the best movies based on historical reward
         print(f"🎯 EXPLOITING with epsilon {epsilon:.2f}")
         
-        scored_titles = []
-        for title in all_titles_in_context:
-            if title not in context_stats: continue # Should not happen, but a safeguard
-            
-            # Calculate the base score (average reward)
-            views = context_stats[title]["count"]
-            reward = context_stats[title]["reward"]
-            avg_reward = reward / max(views, 1)
-            
-            # The final score is now just the confidence score
-            final_score = avg_reward * (1 - (1 / (1 + views)))
-            scored_titles.append((title, final_score))
-
-        # Sort by the final score and get the top 10
-        sorted_titles = sorted(scored_titles, key=lambda x: x[1], reverse=True)
-        top_titles = [title for title, score in sorted_titles[:10]]
+        # Serve the nightly precomputed list while it was built for this exact context
+        # (only for users without a personal overlay - the job ranks shared stats only)
+        precomputed_titles = None if user_overlay else precomputed_recommendations.get(user_id, context_key)
+        if precomputed_titles:
+            recommendations = [catalog.by_title[title] for title in precomputed_titles if title in catalog.by_title]
+            if recommendations:
+                print(f"⚡ Serving {len(recommendations)} precomputed recommendations for {user_id}")
+                return recommendations
+
+        if not user_overlay:
+            # Everyone without personal history gets the shared, already supplemented ranking;
+            # it is only built here, after the precomputed list had its chance
+            # (scoring.rank_stats - the same function the nightly precompute job ranks with)
+            ranked = context_rankings.do(flight_key + ("ranked",), rank_stats, ranking["stats"], catalog, context)
+            return [catalog.by_title[title] for title in ranked if title in catalog.by_title]
+
+        # Blend in this user's own history; same scoring as the nightly precompute job
+        top_titles = rank_titles(ranking["stats"], user_overlay, USER_OVERLAY_WEIGHT, limit=10)
         
         # Convert titles to full movie objects
-        recommendations = [movies_by_title[title] for title in top_titles if title in movies_by_title]
+        recommendations = [catalog.by_title[title] for title in top_titles if title in catalog.by_title]
         
         # Ensure we have 10 recommendations by supplementing if needed
         if len(recommendations) < 10:
@@ -270,81 +369,39 @@ def recommend_movies(context, user_id="default_user"):
         
         return recommendations
 
-def find_similar_contexts(context_key, stats):
-    """Finds contexts similar to the given one based on shared attributes."""
-    key_parts = context_key.split("|")
-    if len(key_parts) != 5:
-        # This context is malformed or old, can't find similarities for it.
-        return []
-    mood, intent, sub_intent, weather, time = key_parts
-    
-    similar_contexts = []
-    
-    for key in stats:
-        other_key_parts = key.split("|")
-        if len(other_key_parts) != 5:
-            # Skip stats from old, 4-part keys
-            continue
-
-        other_mood, other_intent, other_sub_intent, other_weather, other_time = other_key_parts
-        similarity_score = 0
-        
-        # Weight different attributes
-        if mood == other_mood: similarity_score += 0.4
-        if intent == other_intent: similarity_score += 0.3
-        # Only compare sub_intent if it's meaningful
-        if sub_intent and sub_intent == other_sub_intent: similarity_score += 0.15
-        if weather == other_weather: similarity_score += 0.1
-        if time == other_time: similarity_score += 0.05
-        
-        if similarity_score > 0.4:  # Consider contexts with >40% similarity
-            similar_contexts.append(key)
-    
-    return similar_contexts
+def rank_context_candidates(stats_store, context_key, context):
+    """
+    The user-independent part of recommend_movies: the stats for the context
+    (backing off through the rollups if it is unseen) and its epsilon. None if
+    there are no stats at any level.
+    """
+    # Back off through the pre-aggregated rollups if the exact context is unseen
+    scoring_stats, level = stats_store.lookup(context_key)
+    if level and level != "exact":
+        print(f"No exact match for context. Backing off to '{level}' stats...")
+    if not scoring_stats:
+        return None
+    return {
+        "stats": scoring_stats,
+        "titles": list(scoring_stats.keys()),
+        # Explore as a new context until the exact context has views of its own;
+        # back-off stats only stand in for ranking
+        "epsilon": calculate_dynamic_epsilon(scoring_stats if level == "exact" else {}),
+    }
 
 def supplement_recommendations(current_recommendations, context, target_count=10):
     """
-    Supplement recommendations to reach the target count by adding movies
-    that match the mood and intent but aren't in the current context.
+    Supplement recommendations to reach the target count with the movies most
+    similar in content to the ones already chosen, preferring movies that
+    match the intent (then the mood) of the context.
     """
-    current_titles = {movie['title'] for movie in current_recommendations}
-    target_mood = context.get('mood', 'Neutral')
-    target_intent = context.get('intent', 'Entertainment')
-    
-    # Find movies that match the mood and intent but aren't already recommended
-    supplementary_movies = []
-    for movie in all_movies:
-        if movie['title'] in current_titles:
-            continue  # Skip already recommended movies
-            
-        movie_mood = movie.get('mood_tag', 'Neutral')
-        movie_intent = movie.get('intent', 'Entertainment')
-        
-        # Check if movie matches the target mood and intent
-        if movie_mood == target_mood and movie_intent == target_intent:
-            supplementary_movies.append(movie)
-    
-    # If we still don't have enough, add movies with matching intent
-    if len(supplementary_movies) < (target_count - len(current_recommendations)):
-        for movie in all_movies:
-            if movie['title'] in current_titles or movie in supplementary_movies:
-                continue
-                
-            movie_intent = movie.get('intent', 'Entertainment')
-            if movie_intent == target_intent:
-                supplementary_movies.append(movie)
-    
-    # If we still don't have enough, add any remaining movies
-    if len(supplementary_movies) < (target_count - len(current_recommendations)):
-        for movie in all_movies:
-            if movie['title'] in current_titles or movie in supplementary_movies:
-                continue
-            supplementary_movies.append(movie)
-    
-    # Shuffle and add supplementary movies
-    random.shuffle(supplementary_movies)
-    needed_count = target_count - len(current_recommendations)
-    supplementary_movies = supplementary_movies[:needed_count]
+    if target_count - len(current_recommendations) <= 0:
+        return current_recommendations
+    current_titles = [movie['title'] for movie in current_recommendations]
+
+    # One matrix-vector product over the content index instead of repeated catalog scans
+    titles = supplement_titles(catalog, current_titles, context, target_count)
+    supplementary_movies = [catalog.by_title[title] for title in titles if title in catalog.by_title]
     
     # Combine and return
     final_recommendations = current_recommendations + supplementary_movies
@@ -357,34 +414,67 @@ def index():
     """A simple endpoint to confirm the API is running."""
     return jsonify({"status": "ok", "message": "FireTV Recommendation API is running."})
 
+@app.route('/health')
+def health():
+    """Reports the circuit breaker state of each external dependency."""
+    states = {name: breaker.info() for name, breaker in breakers.items()}
+    degraded = [name for name, info in states.items() if info["state"] != "closed"]
+    return jsonify({
+        "status": "degraded" if degraded else "ok",
+        "degraded_dependencies": degraded,
+        "breakers": states,
+        "coalescing": {flight.name: flight.info() for flight in (context_rankings, sentiment_lookups, weather_lookups)},
+    })
+
 @app.route('/api/movies', methods=['GET'])
 def get_all_movies():
     """Returns all movies for search functionality."""
     try:
-        return jsonify(all_movies)
+        catalog.refresh()
+        return app.response_class(catalog.movies_json, mimetype="application/json")
     except Exception as e:
         print(f"❌ Error fetching all movies: {e}")
         return jsonify({"error": "Failed to fetch movies"}), 500
 
+def detect_mood(text):
+    """
+    Returns (mood, source) for a mood answer. The local model answers on its own
+    in SENTIMENT_MODE=local, and in prefilter mode whenever it is confident
+    (except for a SENTIMENT_AUDIT_RATE sample); everything else goes to
+    Comprehend, with the local label as the fallback.
+    """
+    local_mood, confidence = sentiment_model.predict(text)
+    if comprehend is None or SENTIMENT_MODE == 'local':
+        return local_mood, "local"
+    source = "comprehend"
+    if SENTIMENT_MODE == 'prefilter' and confidence >= SENTIMENT_CONFIDENCE_THRESHOLD:
+        if random.random() >= SENTIMENT_AUDIT_RATE:
+            return local_mood, "local"
+        source = "comprehend_audit"
+    try:
+        # Identical texts in flight at the same time share one Comprehend call
+        response = sentiment_lookups.do(
+            text, breakers["comprehend"].call,
+            comprehend.detect_sentiment, Text=text, LanguageCode='en'
+        )
+        return response['Sentiment'].capitalize(), source
+    except CircuitOpenError:
+        return local_mood, "local"
+    except Exception as e:
+        print(f"Comprehend Error: {e}")
+        return local_mood, "local"
+
 def _generate_context_logic(data):
     """Helper function to generate context from request data."""
     mood_response = data.get("mood_response", "")
     activity_response = data.get("activity_response", "")
     sub_intent_text = data.get("sub_intent_text", "") # New field for specific focus tasks
-    user_id = data.get("user_id", "guest")
+    user_id = data.get("user_id") or "guest"
 
-    # 1. Get Mood from AWS Comprehend or fallback
-    mood = "Neutral"
-    if comprehend and mood_response:
-        try:
-            response = comprehend.detect_sentiment(Text=mood_response, LanguageCode='en')
-            mood = response['Sentiment'].capitalize()
-        except Exception as e:
-            print(f"Comprehend Error: {e}")
-            if any(w in mood_response.lower() for w in ["good", "great", "happy", "amazing"]):
-                mood = "Positive"
-            elif any(w in mood_response.lower() for w in ["bad", "sad", "terrible"]):
-                mood = "Negative"
+    # 1. Get Mood from the local model and/or AWS Comprehend (see SENTIMENT_MODE)
+    mood, mood_source = "Neutral", None
+    if mood_response:
+        mood, mood_source = detect_mood(mood_response)
 
     # 2. Get Intent from keyword mapping
     intent, sub_intent = get_intent_from_text(activity_response, sub_intent_text)
@@ -403,35 +493,61 @@ def _generate_context_logic(data):
     if sub_intent:
         context['sub_intent'] = sub_intent
 
-    # Log the generated context to Firestore
+    # Log the generated context to Firestore (skipped while its breaker is open)
     if db:
         try:
             # Use the UserMoods collection as requested
             user_mood_ref = db.collection('UserMoods').document(user_id)
-            user_mood_ref.set({
+            breakers["firestore"].call(user_mood_ref.set, {
                 'context': context,
                 'raw_inputs': data,
+                # Rows labelled by Comprehend double as ml_scripts/benchmark_sentiment.py data
+                'mood_source': mood_source,
                 'timestamp': datetime.now()
-            }, merge=True)
+            }, merge=True, timeout=FIRESTORE_TIMEOUT_SECONDS)
             print(f"✅ Context for user {user_id} saved to UserMoods in Firestore.")
+        except CircuitOpenError:
+            pass
         except Exception as e:
             print(f"❌ Firestore Error: Failed to save user context: {e}")
             
     return context
 
+def invalid_user_id(data):
+    """A 400 response if the request's user_id can't key a Firestore document, else None."""
+    if not valid_document_id(data.get("user_id") or "guest"):
+        return jsonify({"error": "user_id must be a string of at most 1500 bytes without '/', "
+                                 "and not '.', '..' or '__...__'"}), 400
+    return None
+
 @app.route("/generate-context", methods=["POST"])
 def generate_context():
     """Generates a context object from the request data."""
     data = request.get_json() or {}
+    error = invalid_user_id(data)
+    if error:
+        return error
     context = _generate_context_logic(data)
     return jsonify(context)
 
+def parse_flag(value):
+    """True for JSON true / non-zero numbers and "1", "true", "yes", "on" (any case)."""
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
 @app.route("/recommend", methods=["POST"])
 def recommend():
     """Recommend movies based on the provided context."""
     print("✅ --- Request received at /recommend endpoint --- ✅") # Diagnostic print
     data = request.get_json() or {}
-    user_id = data.get("user_id", "guest")
+    error = invalid_user_id(data)
+    if error:
+        return error
+    user_id = data.get("user_id") or "guest"
+    # Clients that already hold /api/movies can ask for titles only
+    compact = parse_flag(data.get("compact")) or parse_flag(request.args.get("compact"))
+    catalog.refresh()
     
     # Generate context internally using the refactored helper function
     context = _generate_context_logic(data)
@@ -441,7 +557,46 @@ def recommend():
     if not recommendations:
         return jsonify({"error": "No recommendations found for this context.", "recommendations": []}), 404
 
-    return jsonify({"recommendations": recommendations})
+    if compact:
+        return jsonify({"recommendations": [movie['title'] for movie in recommendations]})
+
+    # Join the movies' pre-encoded JSON rather than re-serializing every dict
+    body = '{"recommendations":' + catalog.encode_list(recommendations) + '}'
+    return app.response_class(body, mimetype="application/json")
+
+@app.route("/feedback", methods=["POST"])
+def feedback():
+    """Records a user's reward for a recommended movie in their personal overlay."""
+    data = request.get_json() or {}
+    error = invalid_user_id(data)
+    if error:
+        return error
+    user_id = data.get("user_id") or "guest"
+    movie_title = data.get("movie_title")
+    if not movie_title or not isinstance(movie_title, str):
+        return jsonify({"error": "movie_title is required and must be a string"}), 400
+    catalog.refresh()
+    if movie_title not in catalog.by_title:
+        # Unknown titles would take ranking slots in the stats and rollups and then be filtered out
+        return jsonify({"error": "movie_title is not in the catalog"}), 400
+    try:
+        reward = float(data.get("reward", 0))
+    except (TypeError, ValueError):
+        return jsonify({"error": "reward must be a number"}), 400
+    if not math.isfinite(reward):
+        # NaN/inf would poison the arm and every rollup above it for good
+        return jsonify({"error": "reward must be a finite number"}), 400
+    context = data.get("context")
+    if context is not None and not isinstance(context, dict):
+        return jsonify({"error": "context must be an object"}), 400
+
+    user_overlays.record(user_id, movie_title, reward)
+
+    # Shared stats (and their rollups) learn from feedback that carries a context
+    stats_store = stats_loader.get()
+    if context and stats_store is not None:
+        stats_store.record(context_to_key(context), movie_title, reward)
+    return jsonify({"status": "ok"})
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    app.run(debug=os.getenv('FLASK_DEBUG', '1') == '1', port=int(os.getenv('PORT', '5000')))
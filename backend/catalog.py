@@ -0,0 +1,272 @@
+"""
+Movie catalog with pre-serialized JSON fragments.
+
+Every movie is JSON-encoded once when the catalog is loaded, so /recommend and
+/api/movies responses are assembled by joining ready-made strings instead of
+re-encoding the same dicts on every request. The encodings are stored once, as
+the /api/movies array, with each title's (start, end) offsets into it. The encodings
+are rebuilt whenever movies.json changes on disk; reloads are serialized by a
+lock and each rebuilt structure is swapped in whole, never filled in place.
+
+With compact=True the movies are held as __slots__ MovieRecords instead of
+dicts: mood/intent/sub_intent are interned and stored as small integer codes,
+image urls are split into a shared prefix table plus a per-movie suffix, and
+each record gets an integer id. Records expose the read-only dict interface the
+API uses (get, [], in), so the JSON shape of every response is unchanged.
+"""
+
+import json
+import os
+import sys
+import threading
+
+from content_index import ContentIndex
+
+MOVIE_FIELDS = ("title", "description", "url", "mood_tag", "intent", "sub_intent")
+TAG_FIELDS = ("mood_tag", "intent", "sub_intent")
+ABSENT = -1
+
+
+def encode_movie(movie):
+    # Match jsonify's output for a dict (sorted keys, compact, ASCII-escaped)
+    if isinstance(movie, MovieRecord):
+        movie = movie.to_dict()
+    return json.dumps(movie, sort_keys=True, separators=(",", ":"))
+
+
+class TagTable:
+    """Interns repeated strings as small integer codes."""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            value = sys.intern(value)
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+
+class CatalogTables:
+    """String tables shared by every record of one catalog load."""
+
+    def __init__(self):
+        self.tags = TagTable()
+        self.url_prefixes = TagTable()
+
+
+class MovieRecord:
+    """Compact, read-only stand-in for one movies.json dict."""
+
+    __slots__ = ("id", "title", "description", "url_prefix", "url_suffix",
+                 "mood_tag", "intent", "sub_intent", "extra", "tables")
+
+    def __init__(self, movie_id, movie, tables):
+        self.id = movie_id
+        self.tables = tables
+        self.title = movie["title"]
+        self.description = None
+        self.url_prefix = ABSENT
+        self.url_suffix = None
+        self.mood_tag = self.intent = self.sub_intent = ABSENT
+        extra = {}
+        for key, value in movie.items():
+            if key == "title":
+                continue
+            if not isinstance(value, str) or key not in MOVIE_FIELDS:
+                extra[key] = value  # unusual fields keep their original value
+            elif key == "description":
+                self.description = value
+            elif key == "url":
+                prefix, sep, suffix = value.rpartition("/")
+                self.url_prefix = tables.url_prefixes.code(prefix + sep)
+                self.url_suffix = suffix
+            else:
+                setattr(self, key, tables.tags.code(value))
+        self.extra = extra or None
+
+    def get(self, key, default=None):
+        if key == "title":
+            return self.title
+        if key == "description":
+            return default if self.description is None else self.description
+        if key == "url":
+            if self.url_prefix == ABSENT:
+                return default
+            return self.tables.url_prefixes.values[self.url_prefix] + self.url_suffix
+        if key in TAG_FIELDS:
+            code = getattr(self, key)
+            return default if code == ABSENT else self.tables.tags.values[code]
+        if self.extra is not None:
+            return self.extra.get(key, default)
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key, ABSENT)
+        if value is ABSENT:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, ABSENT) is not ABSENT
+
+    def keys(self):
+        keys = [key for key in MOVIE_FIELDS if key in self]
+        if self.extra is not None:
+            keys.extend(self.extra)
+        return keys
+
+    def to_dict(self):
+        return {key: self[key] for key in self.keys()}
+
+
+class Catalog:
+    """In-memory movie list, title index and per-title JSON fragments."""
+
+    def __init__(self, path, compact=False):
+        self.path = path
+        self.compact = compact
+        self.movies = []
+        self.by_title = {}
+        self.by_id = []
+        self._encoded = ("[]", {})  # (movies_json, {title: (start, end)}), swapped as one
+        self.content_index = ContentIndex(dim=int(os.getenv('CONTENT_INDEX_DIM', '512')))
+        self.version = 0
+        self._mtime = None
+        self._lock = threading.Lock()  # one reload at a time; readers never take it
+        self.refresh()
+
+    @property
+    def movies_json(self):
+        return self._encoded[0]
+
+    def fragment(self, title):
+        """The movie's pre-encoded JSON, or None for titles not in the catalog."""
+        movies_json, spans = self._encoded
+        span = spans.get(title)
+        return movies_json[span[0]:span[1]] if span is not None else None
+
+    def refresh(self):
+        """Reload the catalog if movies.json changed since the last load."""
+        if not self.path:
+            return
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return  # another request reloaded it while we waited
+            with open(self.path, 'r', encoding='utf-8') as f:
+                movies = json.load(f)
+            self._set_movies(movies)
+            self._mtime = mtime
+
+    def set_movies(self, movies):
+        """Replace the catalog contents and rebuild every cached encoding."""
+        with self._lock:
+            self._set_movies(movies)
+
+    def _set_movies(self, movies):
+        movies = [movie for movie in movies if isinstance(movie, dict) and 'title' in movie]
+        encoded = [encode_movie(movie) for movie in movies]
+        if self.compact:
+            tables = CatalogTables()
+            movies = [MovieRecord(movie_id, movie, tables) for movie_id, movie in enumerate(movies)]
+        spans = {}
+        start = 1
+        for movie, fragment in zip(movies, encoded):
+            spans[movie['title']] = (start, start + len(fragment))
+            start += len(fragment) + 1
+        by_title = {movie['title']: movie for movie in movies}
+        movies_json = "[" + ",".join(encoded) + "]"
+        # Only titles the index hasn't seen yet get vectorized (published atomically by the index)
+        self.content_index.sync(movies)
+        self._encoded = (movies_json, spans)
+        self.by_title, self.by_id, self.movies = by_title, movies, movies
+        self.version += 1
+
+    def add_movie(self, movie):
+        """Add one movie without rebuilding the existing encodings or index rows."""
+        with self._lock:
+            fragment = encode_movie(movie)
+            if self.compact:
+                tables = self.movies[0].tables if self.movies else CatalogTables()
+                movie = MovieRecord(len(self.by_id), movie, tables)
+            movies = self.movies + [movie]
+            old_json, spans = self._encoded
+            separator = "," if len(movies) > 1 else ""
+            start = len(old_json) - 1 + len(separator)
+            movies_json = old_json[:-1] + separator + fragment + "]"
+            self.content_index.add([movie])
+            self._encoded = (movies_json, {**spans, movie['title']: (start, start + len(fragment))})
+            self.by_title = {**self.by_title, movie['title']: movie}
+            self.by_id = self.movies = movies
+            self.version += 1
+
+    def encode_list(self, movies):
+        """JSON array of movies built from the cached fragments."""
+        parts = []
+        for movie in movies:
+            fragment = self.fragment(movie.get('title'))
+            parts.append(fragment if fragment is not None else encode_movie(movie))
+        return "[" + ",".join(parts) + "]"
+
+
+def deep_sizeof(obj, seen=None):
+    """Approximate retained size of obj in bytes, counting shared objects once."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__slots__"):
+        size += sum(deep_sizeof(getattr(obj, slot), seen) for slot in obj.__slots__ if hasattr(obj, slot))
+    elif hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+def catalog_sizes(catalog):
+    """Retained bytes of everything a Catalog holds, split by part (shared objects counted once)."""
+    seen = set()
+    sizes = {
+        "movies": deep_sizeof(catalog.movies, seen),
+        "title_index": deep_sizeof(catalog.by_title, seen),
+        "encoded_json": deep_sizeof(catalog._encoded, seen),
+        "content_index": deep_sizeof(catalog.content_index, seen),
+    }
+    sizes["total"] = sum(sizes.values())
+    return sizes
+
+
+def memory_report(movies):
+    """Compare the retained size of a whole Catalog with plain movie dicts and compact MovieRecords."""
+    catalogs = {}
+    for mode, compact in (("dict", False), ("compact", True)):
+        # Fresh copies from JSON so neither side shares string objects with the other
+        catalogs[mode] = Catalog(None, compact=compact)
+        catalogs[mode].set_movies(json.loads(json.dumps(movies)))
+    sizes = {mode: catalog_sizes(catalog) for mode, catalog in catalogs.items()}
+    dict_bytes = sizes["dict"]["total"]
+    compact_bytes = sizes["compact"]["total"]
+    tables = catalogs["compact"].movies[0].tables if catalogs["compact"].movies else CatalogTables()
+    return {
+        "movies": len(movies),
+        "dict_bytes": dict_bytes,
+        "compact_bytes": compact_bytes,
+        "saved_pct": round(100 * (1 - compact_bytes / dict_bytes), 1) if dict_bytes else 0.0,
+        "breakdown": sizes,
+        "distinct_tags": len(tables.tags.values),
+        "url_prefixes": len(tables.url_prefixes.values),
+    }
@@ -0,0 +1,124 @@
+"""
+Circuit breakers for the API's external dependencies (wttr.in, AWS Comprehend,
+Firestore).
+
+Each breaker keeps a rolling window of recent call outcomes. Calls that raise,
+or that take longer than `slow_call_seconds`, count as failures. Once the
+failure rate in the window crosses `failure_rate_threshold` the breaker opens
+and callers skip straight to their local fallback. After `open_seconds` a
+limited number of half-open probes are let through; if they succeed the breaker
+closes again, otherwise it re-opens.
+"""
+
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised by CircuitBreaker.call when the dependency is being skipped."""
+
+
+def call_through(breaker, func, *args, **kwargs):
+    """breaker.call(func, ...), or a plain call for components built without a breaker."""
+    if breaker is None:
+        return func(*args, **kwargs)
+    return breaker.call(func, *args, **kwargs)
+
+
+class CircuitBreaker:
+    def __init__(self, name, window_size=20, window_seconds=60, min_calls=5,
+                 failure_rate_threshold=0.5, slow_call_seconds=2.0,
+                 open_seconds=30, half_open_max_calls=1):
+        self.name = name
+        self.window_size = window_size
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self.state = CLOSED
+        self._window = deque(maxlen=window_size)  # (finished_at, ok, latency)
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+        self.rejected_calls = 0
+
+    def allow(self):
+        """True if a call should be attempted now (closed, or a half-open probe slot)."""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self.rejected_calls += 1
+                    return False
+                self.state = HALF_OPEN
+                self._probes_in_flight = 0
+            if self.state == HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_max_calls:
+                    self.rejected_calls += 1
+                    return False
+                self._probes_in_flight += 1
+            return True
+
+    def record(self, ok, latency):
+        """Record the outcome of a call that allow() let through."""
+        if latency > self.slow_call_seconds:
+            ok = False
+        now = time.monotonic()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if ok:
+                    print(f"✅ Circuit '{self.name}' closed after a successful probe.")
+                    self.state = CLOSED
+                    self._window.clear()
+                else:
+                    self._trip(now)
+                return
+
+            self._window.append((now, ok, latency))
+            while self._window and now - self._window[0][0] > self.window_seconds:
+                self._window.popleft()
+            failures = sum(1 for _, call_ok, _ in self._window if not call_ok)
+            if (self.state == CLOSED and len(self._window) >= self.min_calls
+                    and failures / len(self._window) >= self.failure_rate_threshold):
+                self._trip(now)
+
+    def call(self, func, *args, **kwargs):
+        """Run func through the breaker, raising CircuitOpenError if it is open."""
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        start = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record(False, time.monotonic() - start)
+            raise
+        self.record(True, time.monotonic() - start)
+        return result
+
+    def info(self):
+        with self._lock:
+            calls = len(self._window)
+            failures = sum(1 for _, ok, _ in self._window if not ok)
+            latencies = sorted(latency for _, _, latency in self._window)
+            return {
+                "state": self.state,
+                "window_calls": calls,
+                "failure_rate": round(failures / calls, 3) if calls else 0.0,
+                "p50_latency_ms": round(latencies[calls // 2] * 1000, 1) if calls else None,
+                "max_latency_ms": round(latencies[-1] * 1000, 1) if calls else None,
+                "rejected_calls": self.rejected_calls,
+            }
+
+    def _trip(self, now):
+        print(f"⚠️ Circuit '{self.name}' opened; using local fallback for {self.open_seconds}s.")
+        self.state = OPEN
+        self._opened_at = now
+        self._window.clear()
@@ -0,0 +1,241 @@
+"""
+Content-similarity index over the movie catalog.
+
+Each movie's title and description are turned into hashed word unigram/bigram
+TF-IDF vectors and stored as the L2-normalized rows of one sparse CSR matrix
+(indptr/indices/data NumPy arrays: a movie has a few dozen nonzero buckets out
+of `dim`, so a dense float32 matrix would spend ~2 KiB per movie on zeros).
+Finding the movies most similar to a set of already-chosen titles is then a
+single sparse matrix-vector product plus an argpartition top-k.
+
+New titles are added incrementally: only their rows are vectorized, using the
+current document frequencies (existing rows keep their weights until the next
+full rebuild). Titles that leave the catalog are masked out rather than
+removed, so row numbers stay stable; a title whose description or tags changed
+gets a fresh row and its old one is masked out.
+
+Readers never see a half-applied update: writers (serialized by a lock) build
+the next titles/rows/CSR/active/tag arrays off to the side and publish them
+with one reference assignment, and nearest() works on the one state it read.
+"""
+
+import math
+import re
+import threading
+import zlib
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+TITLE_WEIGHT = 2.0  # title words say more about a movie than its blurb
+
+# Tier bonuses for supplementing: intent match beats mood match beats nothing,
+# and cosine similarity (0..1) orders movies within a tier.
+INTENT_MATCH_BONUS = 2.0
+MOOD_MATCH_BONUS = 1.0
+
+
+def hashed_terms(text):
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    terms = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    return terms
+
+
+def _index_dtype(dim):
+    return np.uint16 if dim <= np.iinfo(np.uint16).max + 1 else np.int32
+
+
+def _signature(movie):
+    """Hash of everything a row is built from, to spot movies that changed."""
+    return hash((movie.get('title'), movie.get('description'), movie.get('mood_tag'), movie.get('intent')))
+
+
+class _IndexState:
+    """One published, never mutated version of the index rows."""
+
+    __slots__ = ("titles", "rows", "signatures", "indptr", "indices", "data", "active",
+                 "mood_codes", "intent_codes", "tag_codes")
+
+    def __init__(self, dim, titles=None, rows=None, signatures=None, csr=None, active=None,
+                 mood_codes=None, intent_codes=None, tag_codes=None):
+        self.titles = titles if titles is not None else []
+        self.rows = rows if rows is not None else {}  # title -> current row number
+        self.signatures = signatures if signatures is not None else np.zeros(0, dtype=np.int64)
+        # Row r's nonzero buckets are indices[indptr[r]:indptr[r + 1]], with weights in data
+        self.indptr, self.indices, self.data = csr if csr is not None else (
+            np.zeros(1, dtype=np.int64), np.zeros(0, dtype=_index_dtype(dim)), np.zeros(0, dtype=np.float32))
+        self.active = active if active is not None else np.zeros(0, dtype=bool)
+        self.mood_codes = mood_codes if mood_codes is not None else np.zeros(0, dtype=np.int32)
+        self.intent_codes = intent_codes if intent_codes is not None else np.zeros(0, dtype=np.int32)
+        self.tag_codes = tag_codes if tag_codes is not None else {}
+
+
+class ContentIndex:
+    def __init__(self, movies=(), dim=512):
+        self.dim = dim
+        self.doc_freq = np.zeros(dim, dtype=np.float64)
+        self.doc_count = 0
+        self._state = _IndexState(dim)
+        self._lock = threading.Lock()  # serializes writers; readers just take self._state
+        self.rebuild(movies)
+
+    # Read-only views of the current state
+    titles = property(lambda self: self._state.titles)
+    rows = property(lambda self: self._state.rows)
+    nnz = property(lambda self: len(self._state.data))
+    active = property(lambda self: self._state.active)
+
+    def rebuild(self, movies):
+        """Re-vectorize the whole catalog with fresh document frequencies."""
+        movies = list(movies)
+        with self._lock:
+            counts = [self._term_counts(movie) for movie in movies]
+            self.doc_freq = np.zeros(self.dim, dtype=np.float64)
+            for term_counts in counts:
+                self.doc_freq[list(term_counts)] += 1
+            self.doc_count = len(movies)
+            self._state = self._appended(_IndexState(self.dim), movies, counts)
+
+    def sync(self, movies):
+        """Bring the index in line with the catalog, vectorizing only new titles."""
+        movies = list(movies)
+        current = {movie['title'] for movie in movies}
+        with self._lock:
+            state = self._state
+            active = np.array([title in current and state.rows[title] == row
+                               for row, title in enumerate(state.titles)], dtype=bool)
+            self._state = self._added(self._with_active(state, active), movies)
+
+    def add(self, movies):
+        """Index new movies (unchanged, already indexed titles are re-activated, not re-vectorized)."""
+        with self._lock:
+            self._state = self._added(self._state, movies)
+
+    def match_boost(self, mood=None, intent=None):
+        """Per-row bonus for sharing the target mood tag and intent."""
+        return self._boost(self._state, mood, intent)
+
+    def nearest(self, titles, k, exclude=(), mood=None, intent=None, rng=None):
+        """
+        Titles of the k active movies most similar to `titles` (their summed
+        vectors), skipping `exclude`, with the match_boost(mood, intent) tier
+        bonus added. With no usable seed titles the ranking falls back to the
+        bonus with random tie-breaking.
+        """
+        state = self._state  # everything below reads this one consistent version
+        n = len(state.titles)
+        if n == 0 or k <= 0:
+            return []
+        seed_rows = [state.rows[title] for title in titles if title in state.rows]
+        if seed_rows:
+            query = np.zeros(self.dim, dtype=np.float32)
+            for row in seed_rows:
+                start, end = state.indptr[row], state.indptr[row + 1]
+                query[state.indices[start:end]] += state.data[start:end]  # buckets are unique per row
+            norm = np.linalg.norm(query)
+            scores = self._dot(state, query / norm) if norm else np.zeros(n, dtype=np.float32)
+        else:
+            rng = rng or np.random.default_rng()
+            scores = rng.random(n, dtype=np.float32) * 0.99  # shuffle within each tier
+        scores = scores + self._boost(state, mood, intent)
+        scores[~state.active] = -np.inf
+        excluded = [state.rows[title] for title in exclude if title in state.rows]
+        scores[excluded] = -np.inf
+
+        available = int(np.isfinite(scores).sum())
+        k = min(k, available)
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [state.titles[i] for i in top]
+
+    @staticmethod
+    def _dot(state, vector):
+        """The CSR matrix times a dense vector: one score per row."""
+        scores = np.zeros(len(state.titles), dtype=np.float32)
+        if len(state.data):
+            products = state.data * vector[state.indices]
+            # reduceat sums each row's segment; empty rows have no segment and stay 0
+            nonempty = np.flatnonzero(np.diff(state.indptr))
+            scores[nonempty] = np.add.reduceat(products, state.indptr[nonempty])
+        return scores
+
+    @staticmethod
+    def _boost(state, mood, intent):
+        boost = np.zeros(len(state.titles), dtype=np.float32)
+        if intent is not None and intent in state.tag_codes:
+            boost += (state.intent_codes == state.tag_codes[intent]) * INTENT_MATCH_BONUS
+        if mood is not None and mood in state.tag_codes:
+            boost += (state.mood_codes == state.tag_codes[mood]) * MOOD_MATCH_BONUS
+        return boost
+
+    def _with_active(self, state, active):
+        return _IndexState(self.dim, state.titles, state.rows, state.signatures,
+                           (state.indptr, state.indices, state.data), active,
+                           state.mood_codes, state.intent_codes, state.tag_codes)
+
+    def _added(self, state, movies):
+        fresh = []
+        active = state.active.copy()
+        for movie in movies:
+            row = state.rows.get(movie['title'])
+            if row is not None and state.signatures[row] == _signature(movie):
+                active[row] = True
+            else:
+                if row is not None:
+                    active[row] = False  # stale vector/tags; replaced by the row appended below
+                fresh.append(movie)
+        counts = [self._term_counts(movie) for movie in fresh]
+        for term_counts in counts:
+            self.doc_freq[list(term_counts)] += 1
+        self.doc_count += len(fresh)
+        return self._appended(self._with_active(state, active), fresh, counts)
+
+    def _term_counts(self, movie):
+        term_counts = {}
+        for text, weight in ((movie.get('title', ''), TITLE_WEIGHT), (movie.get('description', ''), 1.0)):
+            for term in hashed_terms(text or ''):
+                bucket = zlib.crc32(term.encode('utf-8')) % self.dim
+                term_counts[bucket] = term_counts.get(bucket, 0.0) + weight
+        return term_counts
+
+    def _appended(self, state, movies, counts):
+        """A new state with `movies` appended as rows (`state` itself is left untouched)."""
+        if not movies:
+            return state
+        idf = np.log((1 + self.doc_count) / (1 + self.doc_freq)) + 1.0
+        new_indices, new_data, lengths = [], [], []
+        for term_counts in counts:
+            buckets = sorted(term_counts)
+            weights = np.array([(1 + math.log(term_counts[b])) * idf[b] for b in buckets], dtype=np.float32)
+            norm = np.linalg.norm(weights)
+            new_indices.extend(buckets)
+            new_data.append(weights / norm if norm else weights)
+            lengths.append(len(buckets))
+        indptr = np.concatenate([state.indptr, state.indptr[-1] + np.cumsum(lengths, dtype=np.int64)])
+        indices = np.concatenate([state.indices, np.array(new_indices, dtype=state.indices.dtype)])
+        data = np.concatenate([state.data, *new_data]).astype(np.float32, copy=False)
+
+        titles = state.titles + [movie['title'] for movie in movies]
+        row_numbers = dict(state.rows)
+        for row, movie in enumerate(movies, start=len(state.titles)):
+            row_numbers[movie['title']] = row
+        tag_codes = dict(state.tag_codes)
+
+        def code(tag):
+            if tag is None:
+                return -1
+            return tag_codes.setdefault(tag, len(tag_codes))
+
+        mood_codes = np.array([code(m.get('mood_tag')) for m in movies], dtype=np.int32)
+        intent_codes = np.array([code(m.get('intent')) for m in movies], dtype=np.int32)
+        return _IndexState(
+            self.dim, titles, row_numbers,
+            np.concatenate([state.signatures, np.array([_signature(m) for m in movies], dtype=np.int64)]),
+            (indptr, indices, data),
+            np.concatenate([state.active, np.ones(len(movies), dtype=bool)]),
+            np.concatenate([state.mood_codes, mood_codes]),
+            np.concatenate([state.intent_codes, intent_codes]),
+            tag_codes,
+        )
@@ -0,0 +1,188 @@
+"""
+Firestore-backed bandit stats with a local read-through cache.
+
+The `bandit_stats` collection (one document per context key, written by
+ml_scripts/upload_to_firestore.py) is the shared source of truth for every API
+instance. Reads are served from a local StatsStore:
+
+- a collection snapshot listener fills the cache and pushes every change made
+  by any instance, so caches converge without polling
+- until the listener's first snapshot arrives, a context that is not cached yet
+  is fetched once on demand (misses are remembered so they are not re-fetched)
+
+Counter updates are applied to the local cache immediately and buffered; a
+background thread flushes them as batched Firestore Increment writes.
+
+The documents hold plain cumulative counters, and every snapshot replaces the
+cached context with them, so half-life decay and the arm budget do not apply
+in this mode: the cache is built without them.
+"""
+
+import threading
+import time
+from collections import defaultdict
+
+from google.cloud import firestore as gcloud_firestore
+
+from circuit_breaker import CircuitOpenError, call_through
+from firestore_utils import MAX_BATCH_WRITES, valid_document_id
+from stats_store import StatsStore
+
+BANDIT_STATS_COLLECTION = "bandit_stats"
+
+
+class FirestoreStatsBackend:
+    def __init__(self, db, collection=BANDIT_STATS_COLLECTION, flush_interval=1.0, breaker=None, timeout=None):
+        self.db = db
+        self.collection = db.collection(collection)
+        self.flush_interval = flush_interval
+        self.breaker = breaker
+        self.timeout = timeout  # seconds per Firestore call; read-through runs on the /recommend path
+        self.store = StatsStore()
+        self._lock = threading.Lock()
+        self._pending = defaultdict(lambda: defaultdict(lambda: [0, 0]))  # key -> title -> [reward, count]
+        self._missing = set()
+        self._synced = threading.Event()
+        self._stop = threading.Event()
+        self._watch = None
+        self._flusher = None
+        self.flushed_writes = 0
+
+    def start(self):
+        self._watch = self.collection.on_snapshot(self._on_snapshot)
+        self._flusher = threading.Thread(target=self._flush_loop, name="bandit-stats-flusher", daemon=True)
+        self._flusher.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._watch is not None:
+            self._watch.unsubscribe()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+        self.flush()
+
+    # The API treats the backend like a StatsFileLoader: get() returns the store to read
+    def get(self):
+        return self
+
+    @property
+    def version(self):
+        return self.store.version
+
+    def lookup(self, context_key):
+        if not self._synced.is_set():
+            self._read_through(context_key)
+        with self._lock:
+            stats, level = self.store.lookup(context_key)
+            # Copy the entries too: record() and the listener thread update them in place
+            return {title: dict(entry) for title, entry in stats.items()}, level
+
+    def record(self, context_key, title, reward, count=1):
+        if not valid_document_id(context_key):
+            # Context keys come from client-supplied contexts ("x/y" weather etc.) and
+            # name the document the increment goes to; one Firestore can't hold is dropped
+            print(f"⚠️ Ignoring feedback for context key {context_key!r}: not a valid document id")
+            return
+        with self._lock:
+            self.store.record(context_key, title, reward, count)
+            pending = self._pending[context_key][title]
+            pending[0] += reward
+            pending[1] += count
+
+    def info(self):
+        with self._lock:
+            info = self.store.info()
+            info.update({
+                "backend": "firestore",
+                "synced": self._synced.is_set(),
+                "pending_contexts": len(self._pending),
+                "flushed_writes": self.flushed_writes,
+            })
+            return info
+
+    def flush(self):
+        """Write buffered increments as batched Increment merges."""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(lambda: defaultdict(lambda: [0, 0]))
+        if not pending:
+            return
+        items = list(pending.items())
+        for start in range(0, len(items), MAX_BATCH_WRITES):
+            chunk = []
+            batch = self.db.batch()
+            for context_key, titles in items[start:start + MAX_BATCH_WRITES]:
+                try:
+                    batch.set(self.collection.document(context_key), {
+                        title: {
+                            "reward": gcloud_firestore.Increment(reward),
+                            "count": gcloud_firestore.Increment(count),
+                        }
+                        for title, (reward, count) in titles.items()
+                    }, merge=True)
+                    chunk.append((context_key, titles))
+                except ValueError as e:
+                    # Retrying would fail the same way (and block the rest of the batch)
+                    print(f"❌ Dropping bandit stats updates for {context_key!r}: {e}")
+            if not chunk:
+                continue
+            try:
+                call_through(self.breaker, batch.commit, timeout=self.timeout)
+                self.flushed_writes += len(chunk)
+            except Exception as e:
+                print(f"❌ Firestore Error: Failed to flush bandit stats, will retry: {e}")
+                self._requeue(chunk)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Bandit stats flush failed: {e}")
+
+    def _requeue(self, chunk):
+        with self._lock:
+            for context_key, titles in chunk:
+                for title, (reward, count) in titles.items():
+                    pending = self._pending[context_key][title]
+                    pending[0] += reward
+                    pending[1] += count
+
+    def _read_through(self, context_key):
+        with self._lock:
+            if context_key in self.store.contexts or context_key in self._missing:
+                return
+        try:
+            snapshot = call_through(self.breaker, self.collection.document(context_key).get, timeout=self.timeout)
+        except CircuitOpenError:
+            return
+        except Exception as e:
+            print(f"❌ Firestore Error: Failed to read stats for {context_key}: {e}")
+            return
+        with self._lock:
+            if snapshot.exists:
+                self._apply_document(context_key, snapshot.to_dict() or {})
+            else:
+                self._missing.add(context_key)
+
+    def _on_snapshot(self, documents, changes, read_time):
+        with self._lock:
+            for change in changes:
+                context_key = change.document.id
+                if change.type.name == "REMOVED":
+                    self.store.remove_context(context_key)
+                else:
+                    self._apply_document(context_key, change.document.to_dict() or {})
+                    self._missing.discard(context_key)
+        if not self._synced.is_set():
+            self._synced.set()
+            print(f"✅ Bandit stats synced from Firestore: {len(self.store.contexts)} contexts.")
+
+    def _apply_document(self, context_key, movies):
+        # Increments not flushed yet are not in the document; keep them on top of it
+        movies = {title: dict(entry) for title, entry in movies.items() if isinstance(entry, dict)}
+        for title, (reward, count) in self._pending.get(context_key, {}).items():
+            entry = movies.setdefault(title, {"reward": 0, "count": 0})
+            entry["reward"] = entry.get("reward", 0) + reward
+            entry["count"] = entry.get("count", 0) + count
+        self.store.replace_context(context_key, movies, timestamp=time.time())
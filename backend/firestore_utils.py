@@ -0,0 +1,41 @@
+"""
+Helpers shared by the Firestore-backed components.
+"""
+
+import os
+
+MAX_BATCH_WRITES = 500  # Firestore's per-batch limit
+MAX_DOCUMENT_ID_BYTES = 1500  # Firestore's limit
+
+SERVICE_ACCOUNT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "serviceAccountKey.json")
+
+
+def init_firestore(cred_path=SERVICE_ACCOUNT_PATH):
+    """
+    Firestore client for the default Firebase app, initializing the app on
+    first use. With FIRESTORE_EMULATOR_HOST set it talks to the emulator,
+    which needs no key (project: GCLOUD_PROJECT, default "demo-firetv").
+    """
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    if not firebase_admin._apps:
+        if os.getenv("FIRESTORE_EMULATOR_HOST"):
+            firebase_admin.initialize_app(options={"projectId": os.getenv("GCLOUD_PROJECT", "demo-firetv")})
+        else:
+            firebase_admin.initialize_app(credentials.Certificate(cred_path))
+    return firestore.client()
+
+
+def valid_document_id(value):
+    """
+    True if `value` can be used as a Firestore document id: a non-empty string
+    of at most 1500 bytes without "/", other than "." / ".." and not of the
+    reserved "__name__" form. Ids that break these rules fail when the
+    document reference is built or when the write commits.
+    """
+    if not isinstance(value, str) or not value or "/" in value:
+        return False
+    if value in (".", "..") or (value.startswith("__") and value.endswith("__")):
+        return False
+    return len(value.encode("utf-8")) <= MAX_DOCUMENT_ID_BYTES
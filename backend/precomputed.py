@@ -0,0 +1,115 @@
+"""
+Nightly precomputed per-user recommendation lists.
+
+ml_scripts/precompute_user_recommendations.py ranks every returning user's
+last known context offline and stores the result in the UserRecommendations
+collection as {context_key, titles, generated_at}. The API looks a user's list
+up here and serves it directly while the request's context key still matches
+the one it was computed for and the list is not older than max_age_seconds.
+
+Lookups are cached in a bounded LRU (misses included, so users without a list
+cost one Firestore read per cache lifetime, not one per request).
+
+Trade-off: each cache miss is a synchronous Firestore read on the request
+path, while the live ranking it replaces is in memory and coalesced across
+requests, so the API only enables this with PRECOMPUTED_RECOMMENDATIONS=1.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from circuit_breaker import CircuitOpenError, call_through
+from user_overlays import ANONYMOUS_USER_IDS
+
+USER_RECOMMENDATIONS_COLLECTION = "UserRecommendations"
+
+_MISSING = object()
+
+
+class PrecomputedStore:
+    """Read-through LRU cache over the UserRecommendations collection."""
+
+    def __init__(self, db=None, capacity=50000, max_age_seconds=86400, cache_seconds=600,
+                 collection=USER_RECOMMENDATIONS_COLLECTION, breaker=None, timeout=None):
+        self.db = db
+        self.breaker = breaker
+        self.timeout = timeout  # seconds per Firestore read
+        self.capacity = max(1, capacity)
+        self.max_age_seconds = max_age_seconds
+        self.cache_seconds = cache_seconds
+        self.collection = collection
+        self._entries = OrderedDict()  # user_id -> (loaded_at, doc or _MISSING)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id, context_key):
+        """Precomputed titles for the user if they were built for `context_key` and are fresh, else None."""
+        if not self.db or user_id is None or user_id in ANONYMOUS_USER_IDS:
+            return None
+        doc = self._cached(user_id)
+        if doc is _MISSING:
+            doc = self._load(user_id)
+            if doc is _MISSING:
+                doc = None  # read failed; try again next request rather than caching it
+            else:
+                with self._lock:
+                    self._entries[user_id] = (time.monotonic(), doc)
+                    self._entries.move_to_end(user_id)
+                    while len(self._entries) > self.capacity:
+                        self._entries.popitem(last=False)
+
+        titles = None
+        if doc is not None and doc.get("context_key") == context_key and self._fresh(doc):
+            titles = doc.get("titles") or None
+        with self._lock:
+            if titles:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return titles
+
+    def info(self):
+        with self._lock:
+            return {
+                "cached_users": len(self._entries),
+                "capacity": self.capacity,
+                "max_age_seconds": self.max_age_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _cached(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return _MISSING
+            loaded_at, doc = entry
+            if time.monotonic() - loaded_at > self.cache_seconds:
+                del self._entries[user_id]
+                return _MISSING
+            self._entries.move_to_end(user_id)
+            return doc
+
+    def _fresh(self, doc):
+        if not self.max_age_seconds:
+            return True
+        generated_at = doc.get("generated_at")
+        if generated_at is None:
+            return False
+        if generated_at.tzinfo is None:
+            generated_at = generated_at.replace(tzinfo=timezone.utc)
+        return (datetime.now(timezone.utc) - generated_at).total_seconds() <= self.max_age_seconds
+
+    def _load(self, user_id):
+        try:
+            snapshot = call_through(self.breaker, self.db.collection(self.collection).document(user_id).get,
+                                    timeout=self.timeout)
+            return snapshot.to_dict() if snapshot.exists else None
+        except CircuitOpenError:
+            return _MISSING
+        except Exception as e:
+            print(f"❌ Firestore Error: Failed to load precomputed recommendations for {user_id}: {e}")
+            return _MISSING
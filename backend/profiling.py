@@ -0,0 +1,275 @@
+"""
+On-demand request profiling for the API.
+
+An admin arms a profiling session for the next N requests and/or a time window,
+optionally limited to one route, in either mode:
+
+- "deterministic": cProfile around each selected request, aggregated into one
+  pstats profile (download with format=pstats)
+- "sampling": a background thread samples the stacks of threads that are
+  handling selected requests; stacks are aggregated as collapsed-stack lines
+  for flamegraph tools (download with format=collapsed)
+
+A single request can also opt in with the `X-Profile: deterministic|sampling`
+header (plus the admin token). Everything covered by the request - context
+generation, recommend_movies and response serialization - shows up in the
+profile.
+
+Deterministic profiling covers one request at a time: from Python 3.12 only
+one cProfile can be enabled per interpreter, so requests selected while another
+is being profiled run unprofiled and are counted as skipped.
+
+Nothing is registered unless an admin token is configured, so with profiling
+off the request path is untouched.
+"""
+
+import cProfile
+import hmac
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import g, jsonify, request
+
+MODES = ("deterministic", "sampling")
+
+
+class RequestProfiler:
+    def __init__(self, app=None, admin_token=None, sample_interval=0.005):
+        self.admin_token = admin_token
+        self.sample_interval = sample_interval
+        self._lock = threading.Lock()
+        self._session = None
+        self._stats = None  # aggregated pstats.Stats
+        self._stacks = Counter()  # collapsed stack -> samples
+        self._active_threads = set()
+        self._sampler = None
+        self._deterministic = threading.Lock()  # held while a cProfile is enabled
+        self.profiled_requests = 0
+        self.skipped_requests = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule("/admin/profiling/start", "profiling_start", self._start_view, methods=["POST"])
+        app.add_url_rule("/admin/profiling/stop", "profiling_stop", self._stop_view, methods=["POST"])
+        app.add_url_rule("/admin/profiling/status", "profiling_status", self._status_view, methods=["GET"])
+        app.add_url_rule("/admin/profiling/download", "profiling_download", self._download_view, methods=["GET"])
+
+    # --- Session control ---
+
+    def start(self, mode="deterministic", requests=None, seconds=None, route=None):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        with self._lock:
+            self._session = {
+                "mode": mode,
+                "remaining": requests,
+                "deadline": time.monotonic() + seconds if seconds else None,
+                "route": route,
+            }
+            self._stats = None
+            self._stacks = Counter()
+            self.profiled_requests = 0
+            self.skipped_requests = 0
+        if mode == "sampling":
+            self._ensure_sampler()
+
+    def stop(self):
+        with self._lock:
+            self._session = None
+
+    def status(self):
+        with self._lock:
+            session = dict(self._session) if self._session else None
+            if session and session["deadline"]:
+                session["seconds_left"] = round(max(0.0, session.pop("deadline") - time.monotonic()), 1)
+            elif session:
+                session.pop("deadline")
+            return {
+                "armed": session is not None,
+                "session": session,
+                "profiled_requests": self.profiled_requests,
+                "skipped_requests": self.skipped_requests,
+                "has_pstats": self._stats is not None,
+                "collapsed_samples": sum(self._stacks.values()),
+            }
+
+    def _claim(self):
+        """Mode to profile the current request with, or None."""
+        header_mode = request.headers.get("X-Profile")
+        if header_mode and self._authorized():
+            return header_mode if header_mode in MODES else "deterministic"
+        if self._session is None:
+            return None
+        with self._lock:
+            session = self._session
+            if session is None:
+                return None
+            if session["deadline"] and time.monotonic() > session["deadline"]:
+                self._session = None
+                return None
+            if session["route"] and request.path != session["route"]:
+                return None
+            if request.path.startswith("/admin/profiling"):
+                return None
+            if session["remaining"] is not None:
+                session["remaining"] -= 1
+                if session["remaining"] <= 0:
+                    self._session = None  # this was the last one
+            return session["mode"]
+
+    # --- Request hooks ---
+
+    def _before_request(self):
+        mode = self._claim()
+        if mode is None:
+            return
+        if mode == "deterministic":
+            if not self._deterministic.acquire(blocking=False):
+                self._skip()
+                return
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:  # another profiler (e.g. a debugger) owns the hook
+                self._deterministic.release()
+                self._skip()
+                return
+            g._profiler = profiler
+        else:
+            self._ensure_sampler()
+            with self._lock:
+                self._active_threads.add(threading.get_ident())
+        g._profile_mode = mode
+
+    def _skip(self):
+        with self._lock:
+            self.skipped_requests += 1
+
+    def _teardown_request(self, exc):
+        mode = g.pop("_profile_mode", None)
+        if mode is None:
+            return
+        if mode == "deterministic":
+            profiler = g.pop("_profiler")
+            profiler.disable()
+            self._deterministic.release()
+            with self._lock:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profiler)
+                else:
+                    self._stats.add(profiler)
+                self.profiled_requests += 1
+        else:
+            with self._lock:
+                self._active_threads.discard(threading.get_ident())
+                self.profiled_requests += 1
+
+    # --- Sampling ---
+
+    def _ensure_sampler(self):
+        with self._lock:
+            if self._sampler is not None and self._sampler.is_alive():
+                return
+            self._sampler = threading.Thread(target=self._sample_loop, name="request-sampler", daemon=True)
+            self._sampler.start()
+
+    def _sample_loop(self):
+        idle_since = time.monotonic()
+        while True:
+            time.sleep(self.sample_interval)
+            with self._lock:
+                threads = set(self._active_threads)
+                armed = self._session is not None and self._session["mode"] == "sampling"
+            if not threads:
+                # Stop once nothing is being sampled and no sampling session is armed
+                if not armed and time.monotonic() - idle_since > 1.0:
+                    with self._lock:
+                        self._sampler = None
+                    return
+                continue
+            idle_since = time.monotonic()
+            frames = sys._current_frames()
+            collapsed = []
+            for ident in threads:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if stack:
+                    collapsed.append(";".join(reversed(stack)))
+            with self._lock:
+                self._stacks.update(collapsed)
+
+    # --- Admin views ---
+
+    def _authorized(self):
+        supplied = request.headers.get("X-Admin-Token", "")
+        return bool(self.admin_token) and hmac.compare_digest(supplied, self.admin_token)
+
+    def _start_view(self):
+        if not self._authorized():
+            return jsonify({"error": "forbidden"}), 403
+        data = request.get_json(silent=True) or {}
+        requests_count = data.get("requests")
+        seconds = data.get("seconds")
+        if requests_count is None and seconds is None:
+            requests_count = 100
+        try:
+            self.start(
+                mode=data.get("mode", "deterministic"),
+                requests=int(requests_count) if requests_count is not None else None,
+                seconds=float(seconds) if seconds is not None else None,
+                route=data.get("route"),
+            )
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(self.status())
+
+    def _stop_view(self):
+        if not self._authorized():
+            return jsonify({"error": "forbidden"}), 403
+        self.stop()
+        return jsonify(self.status())
+
+    def _status_view(self):
+        if not self._authorized():
+            return jsonify({"error": "forbidden"}), 403
+        return jsonify(self.status())
+
+    def _download_view(self):
+        if not self._authorized():
+            return jsonify({"error": "forbidden"}), 403
+        fmt = request.args.get("format", "pstats")
+        if fmt == "collapsed":
+            with self._lock:
+                lines = [f"{stack} {count}" for stack, count in self._stacks.most_common()]
+            return "\n".join(lines) + "\n", 200, {"Content-Type": "text/plain; charset=utf-8"}
+        if fmt == "pstats":
+            with self._lock:
+                if self._stats is None:
+                    return jsonify({"error": "no deterministic profile collected"}), 404
+                body = marshal.dumps(self._stats.stats)  # same format as Stats.dump_stats
+            return body, 200, {
+                "Content-Type": "application/octet-stream",
+                "Content-Disposition": "attachment; filename=api.pstats",
+            }
+        if fmt == "text":
+            with self._lock:
+                if self._stats is None:
+                    return jsonify({"error": "no deterministic profile collected"}), 404
+                out = io.StringIO()
+                self._stats.stream = out
+                self._stats.sort_stats("cumulative").print_stats(40)
+            return out.getvalue(), 200, {"Content-Type": "text/plain; charset=utf-8"}
+        return jsonify({"error": "format must be pstats, collapsed or text"}), 400
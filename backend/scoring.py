@@ -0,0 +1,68 @@
+"""
+Bandit scoring shared by the API and offline jobs.
+
+Pure functions over a stats bucket ({title: {"reward", "count"}}) and a Catalog,
+so ml_scripts/precompute_user_recommendations.py ranks contexts exactly the way
+recommend_movies does without importing the Flask app.
+"""
+
+import heapq
+
+
+def context_to_key(context):
+    """Convert a context dictionary to a unique string key (always the same order of keys!)."""
+    return f"{context.get('mood','')}|{context.get('intent','')}|{context.get('sub_intent', '')}|{context.get('weather','')}|{context.get('time_of_day','') or context.get('timeOfDay','')}"
+
+
+def confidence_score(reward, views):
+    """Average reward damped by how few views it is based on."""
+    avg_reward = reward / max(views, 1)
+    return avg_reward * (1 - (1 / (1 + views)))
+
+
+def rank_titles(scoring_stats, user_overlay=None, overlay_weight=0.0, limit=10):
+    """Top `limit` titles by confidence score, blending in a user's own history."""
+    scored_titles = []
+    for title, entry in scoring_stats.items():
+        views = entry["count"]
+        reward = entry["reward"]
+        user_stats = user_overlay.get(title) if user_overlay else None
+        if user_stats:
+            reward += overlay_weight * user_stats[0]
+            views += overlay_weight * user_stats[1]
+        scored_titles.append((title, confidence_score(reward, views)))
+    return [title for title, score in heapq.nlargest(limit, scored_titles, key=lambda x: x[1])]
+
+
+def supplement_titles(catalog, current_titles, context, target_count=10):
+    """
+    Titles to add to `current_titles` to reach target_count: the movies most
+    similar in content to the ones already chosen, preferring movies that
+    match the intent (then the mood) of the context.
+    """
+    needed_count = target_count - len(current_titles)
+    if needed_count <= 0:
+        return []
+    return catalog.content_index.nearest(current_titles, needed_count, exclude=current_titles,
+                                         mood=context.get('mood', 'Neutral'),
+                                         intent=context.get('intent', 'Entertainment'))
+
+
+def rank_stats(scoring_stats, catalog, context, limit=10):
+    """
+    The exploitation ranking recommend_movies serves users without a personal
+    overlay: the top catalog titles of a stats bucket, supplemented to `limit`.
+    """
+    titles = [title for title in rank_titles(scoring_stats, limit=limit) if title in catalog.by_title]
+    return titles + supplement_titles(catalog, titles, context, limit)
+
+
+def rank_context(stats_store, catalog, context_key, context, limit=10):
+    """
+    rank_stats for a context, backing off through the rollups like the API.
+    Empty if the stats have nothing for the context at any back-off level.
+    """
+    scoring_stats, level = stats_store.lookup(context_key)
+    if not scoring_stats:
+        return []
+    return rank_stats(scoring_stats, catalog, context, limit)
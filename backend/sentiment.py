@@ -0,0 +1,184 @@
+"""
+Local sentiment model for mood answers.
+
+A lexicon gives each known word a valence (-3..3). Valences are compiled once
+into a NumPy weight vector indexed by vocabulary id, so scoring a text is a
+tokenize + dict lookup followed by a few array operations:
+
+- negators ("not", "never", "don't", ...) flip and damp the valence of the
+  next NEGATION_WINDOW words
+- intensifiers ("very", "a bit", ...) scale the word that follows them
+- the summed positive and negative evidence, their overlap (both present ->
+  Mixed) and a bias go through a small linear layer and a softmax over
+  Comprehend's four labels
+
+predict() returns (label, confidence), where confidence is the winning class
+probability. Callers route texts below their confidence threshold to
+Comprehend. predict_batch() scores many texts in one vectorized pass (used by
+ml_scripts/benchmark_sentiment.py).
+
+The linear layer ships with hand-set DEFAULT_WEIGHTS; fit_weights() refits it
+on Comprehend-labelled texts (benchmark_sentiment.py --fit --save-weights) and
+load_weights() reads the result back (SENTIMENT_WEIGHTS_PATH in the API).
+"""
+
+import json
+import re
+
+import numpy as np
+
+LABELS = ("Positive", "Negative", "Neutral", "Mixed")
+TOKEN_PATTERN = re.compile(r"[a-z]+(?:'[a-z]+)?")
+NEGATION_WINDOW = 3
+NEGATION_SCALE = -0.75
+
+LEXICON = {
+    # positive
+    "good": 1.9, "great": 3.0, "happy": 2.7, "amazing": 2.8, "awesome": 3.0, "fantastic": 3.0,
+    "wonderful": 2.9, "excellent": 3.0, "excited": 2.3, "exciting": 2.2, "glad": 2.0, "joy": 2.8,
+    "joyful": 2.8, "cheerful": 2.4, "love": 3.0, "loving": 2.6, "lovely": 2.6, "nice": 1.8,
+    "fine": 0.8, "okay": 0.4, "ok": 0.4, "alright": 0.6, "calm": 1.2, "relaxed": 1.8, "peaceful": 1.9,
+    "content": 1.5, "chill": 1.2, "cozy": 1.6, "comfortable": 1.5, "energetic": 1.9, "energized": 2.0,
+    "motivated": 2.0, "inspired": 2.2, "productive": 1.8, "proud": 2.2, "grateful": 2.4,
+    "thankful": 2.3, "thrilled": 2.9, "pumped": 2.1, "hopeful": 1.8, "optimistic": 2.0,
+    "refreshed": 2.0, "rested": 1.5, "fun": 2.3, "better": 1.6, "best": 2.8, "well": 1.1,
+    "positive": 2.0, "pleased": 2.1, "satisfied": 1.9, "blessed": 2.4, "ecstatic": 3.0,
+    "delighted": 2.8, "playful": 1.9, "curious": 1.0, "confident": 2.1, "free": 1.3,
+    "laugh": 2.0, "smile": 1.9, "yay": 2.5, "cool": 1.3, "perfect": 2.8, "incredible": 2.8,
+    "enjoy": 2.1, "enjoying": 2.1, "celebrate": 2.5, "celebrating": 2.5,
+    "relieved": 1.7, "safe": 1.3, "sunny": 0.8, "bright": 1.2, "fresh": 1.2, "strong": 1.4,
+    # negative
+    "bad": -2.5, "sad": -2.1, "terrible": -2.9, "awful": -2.9, "horrible": -2.9, "worst": -3.0,
+    "tired": -1.1, "exhausted": -1.9, "sleepy": -0.8, "drained": -1.8, "stressed": -2.1,
+    "stress": -1.9, "stressful": -2.1, "anxious": -2.0, "anxiety": -2.1, "worried": -1.9,
+    "nervous": -1.5, "angry": -2.6, "mad": -2.2, "furious": -2.9, "annoyed": -1.9, "irritated": -1.9,
+    "frustrated": -2.1, "upset": -2.1, "depressed": -2.8, "down": -1.2, "low": -1.1, "lonely": -2.0,
+    "bored": -1.3, "boring": -1.5, "meh": -0.6, "blah": -0.8, "sick": -1.9, "ill": -1.8,
+    "hurt": -2.0, "pain": -2.2, "miserable": -2.8, "unhappy": -2.4, "overwhelmed": -2.0,
+    "burnt": -1.6, "burned": -1.6, "gloomy": -1.8, "grumpy": -1.8, "scared": -2.1, "afraid": -2.0,
+    "lost": -1.3, "confused": -1.1, "hate": -2.8, "cry": -2.1, "crying": -2.2, "heartbroken": -2.9,
+    "disappointed": -2.1, "sucks": -2.2, "rough": -1.4, "hard": -0.8, "tough": -0.9,
+    "worse": -2.1, "lazy": -0.9, "restless": -1.2, "moody": -1.3, "cranky": -1.8, "sore": -1.2,
+    "negative": -2.0, "rainy": -0.5, "dull": -1.3, "empty": -1.6, "hopeless": -2.7,
+    "ugh": -1.6, "worn": -1.2, "fed": -0.6, "broke": -1.4, "busy": -0.6,
+}
+NEGATORS = {"not", "no", "never", "nothing", "nobody", "none", "neither", "nor", "without", "hardly", "barely"}
+INTENSIFIERS = {
+    "very": 1.3, "really": 1.3, "so": 1.25, "extremely": 1.5, "super": 1.4, "totally": 1.3,
+    "incredibly": 1.5, "absolutely": 1.4, "completely": 1.3, "quite": 1.15, "too": 1.2,
+    "slightly": 0.6, "kinda": 0.7, "somewhat": 0.7, "little": 0.7, "bit": 0.6, "fairly": 0.8,
+}
+
+# Linear layer: rows are features (positive evidence, negative evidence,
+# overlap of the two, bias), columns are LABELS. Hand-set, not fitted: each kind
+# of evidence votes for its own label, overlap votes Mixed, and the bias makes
+# Neutral win when no lexicon word is present. Refit with fit_weights().
+DEFAULT_WEIGHTS = np.array([
+    [1.5, -1.0, -1.0, 0.3],
+    [-1.0, 1.5, -1.0, 0.3],
+    [-1.0, -1.0, 0.0, 2.2],
+    [0.0, 0.0, 0.5, -1.5],
+], dtype=np.float64)
+
+
+class SentimentModel:
+    def __init__(self, lexicon=None, weights=None):
+        lexicon = dict(LEXICON if lexicon is None else lexicon)
+        words = sorted(set(lexicon) | NEGATORS | set(INTENSIFIERS))
+        self.vocabulary = {word: i + 1 for i, word in enumerate(words)}  # 0 = unknown/padding
+        size = len(words) + 1
+        self.valence = np.zeros(size)
+        self.is_negator = np.zeros(size)
+        self.intensity = np.ones(size)
+        for word, i in self.vocabulary.items():
+            self.valence[i] = lexicon.get(word, 0.0)
+            self.is_negator[i] = word in NEGATORS
+            self.intensity[i] = INTENSIFIERS.get(word, 1.0)
+        self.weights = DEFAULT_WEIGHTS if weights is None else np.asarray(weights, dtype=np.float64)
+
+    def token_ids(self, text):
+        ids = []
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            if token.endswith("n't"):
+                ids.append(self.vocabulary["not"])
+            else:
+                ids.append(self.vocabulary.get(token, 0))
+        return ids
+
+    def predict(self, text):
+        """(label, confidence) for one text."""
+        probabilities = self.predict_proba([text])[0]
+        best = int(probabilities.argmax())
+        return LABELS[best], float(probabilities[best])
+
+    def predict_batch(self, texts):
+        """[(label, confidence), ...] for many texts in one vectorized pass."""
+        probabilities = self.predict_proba(texts)
+        best = probabilities.argmax(axis=1)
+        return [(LABELS[i], float(p[i])) for i, p in zip(best, probabilities)]
+
+    def predict_proba(self, texts):
+        """Class probabilities (len(texts) x len(LABELS))."""
+        return softmax(self.features(texts) @ self.weights)
+
+    def features(self, texts):
+        """The linear layer's inputs (len(texts) x 4)."""
+        # Concatenate every text's token ids with NEGATION_WINDOW padding ids between
+        # texts so the negation/intensifier windows never reach into the next text
+        ids, owners = [], []
+        for n, text in enumerate(texts):
+            text_ids = self.token_ids(text or "")
+            ids.extend(text_ids)
+            ids.extend([0] * NEGATION_WINDOW)
+            owners.extend([n] * (len(text_ids) + NEGATION_WINDOW))
+        ids = np.array(ids, dtype=np.int64)
+        owners = np.array(owners, dtype=np.int64)
+
+        valence = self.valence[ids]
+        if len(ids) > 1:
+            # Intensifiers scale the word right after them
+            valence[1:] *= self.intensity[ids[:-1]]
+            # Negators flip the next NEGATION_WINDOW words
+            negated = np.convolve(self.is_negator[ids], np.ones(NEGATION_WINDOW))[:len(ids)]
+            negated = np.concatenate([[0.0], negated[:-1]]) > 0
+            valence[negated] *= NEGATION_SCALE
+
+        positive = np.bincount(owners, weights=np.maximum(valence, 0), minlength=len(texts))
+        negative = np.bincount(owners, weights=np.maximum(-valence, 0), minlength=len(texts))
+        return np.column_stack([positive, negative, np.minimum(positive, negative), np.ones(len(texts))])
+
+
+def softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def fit_weights(model, texts, labels, sample_weights=None, l2=0.01, learning_rate=0.1, steps=2000):
+    """
+    Softmax regression of the linear layer on labelled texts (full-batch
+    gradient descent from the model's current weights). The lexicon is kept
+    as is; only the 4x4 layer is learned.
+    """
+    features = model.features(texts)
+    targets = np.zeros((len(labels), len(LABELS)))
+    targets[np.arange(len(labels)), [LABELS.index(label) for label in labels]] = 1.0
+    sample_weights = np.ones(len(labels)) if sample_weights is None else np.asarray(sample_weights, dtype=np.float64)
+    sample_weights = sample_weights / sample_weights.sum()
+    weights = model.weights.copy()
+    for _ in range(steps):
+        error = (softmax(features @ weights) - targets) * sample_weights[:, None]
+        gradient = features.T @ error + l2 * weights
+        weights -= learning_rate * gradient
+    return weights
+
+
+def load_weights(path):
+    """Weights saved by benchmark_sentiment.py --save-weights, or None without a path."""
+    if not path:
+        return None
+    with open(path) as f:
+        weights = np.array(json.load(f)["weights"], dtype=np.float64)
+    if weights.shape != DEFAULT_WEIGHTS.shape:
+        raise ValueError(f"expected {DEFAULT_WEIGHTS.shape} sentiment weights, got {weights.shape}")
+    return weights
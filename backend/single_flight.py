@@ -0,0 +1,66 @@
+"""
+Single-flight request coalescing.
+
+Concurrent callers asking for the same key share one in-flight computation:
+the first caller (the leader) runs the function, everyone arriving while it
+runs waits and receives the same result (or the same exception). Nothing is
+cached afterwards - the next call for the key once the flight has landed
+starts a fresh computation - so results are never staler than the slowest
+concurrent request.
+"""
+
+import threading
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self._flights = {}  # key -> _Flight
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executions = 0
+
+    def do(self, key, func, *args, **kwargs):
+        """Run func(*args, **kwargs) once per key across concurrent callers."""
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.executions += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func(*args, **kwargs)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    def info(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executions": self.executions,
+                "coalesced": self.calls - self.executions,
+                "in_flight": len(self._flights),
+            }
@@ -0,0 +1,440 @@
+"""
+In-memory bandit statistics with pre-aggregated back-off rollups.
+
+Fine-grained stats are keyed by the full 5-part context key
+("mood|intent|sub_intent|weather|time_of_day"). Alongside them we keep rolled-up
+reward/count totals at coarser levels so a context we have never seen can back
+off in a handful of dict lookups to a properly scored ranking instead of
+scanning every stored context.
+
+Rewards and counts decay exponentially with a configurable half-life. Decay is
+applied lazily from each arm's last-update timestamp whenever the arm is read or
+written, so there are no periodic sweeps. An optional arm budget evicts the
+least-weighted arms (and any context left empty) once the store grows past it,
+so memory tracks recent traffic rather than all history.
+
+The API reads and writes through SnapshotStats: lock-free reads of an
+immutable snapshot, with writes buffered and merged into a new snapshot in the
+background (read-copy-update).
+"""
+
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+
+# Back-off order, most specific first. Each level lists the key parts it keeps.
+ROLLUP_LEVELS = [
+    ("mood_intent", (0, 1)),
+    ("intent_sub_intent", (1, 2)),
+    ("intent", (1,)),
+    ("global", ()),
+]
+
+# Store versions come from one counter so a reloaded store never reuses a version
+_versions = itertools.count(1)
+
+
+def rollup_key(key_parts, positions):
+    return "|".join(key_parts[i] for i in positions)
+
+
+def _copy_bucket(bucket):
+    return {title: dict(entry) for title, entry in bucket.items()}
+
+
+class StatsStore:
+    """Context stats plus incrementally maintained rollups, with lazy time decay."""
+
+    def __init__(self, contexts=None, half_life_seconds=None, max_arms=None,
+                 min_arm_weight=0.01):
+        self.half_life_seconds = half_life_seconds
+        self.max_arms = max_arms
+        self.min_arm_weight = min_arm_weight
+        self.contexts = {}
+        self.rollups = {level: {} for level, _ in ROLLUP_LEVELS}
+        self.arm_count = 0
+        self.evicted_arms = 0
+        self.version = next(_versions)  # bumped on every write; lets callers tell stale reads apart
+        now = time.time()
+        # Undated arms (raw bandit_stats.json) start decaying now; only files that carry
+        # `updated` (ml_scripts/compact_bandit_stats.py output) keep their age across restarts
+        for context_key, movies in (contexts or {}).items():
+            for title, entry in movies.items():
+                self.record(context_key, title, entry.get("reward", 0), entry.get("count", 0),
+                            timestamp=entry.get("updated", now), enforce_budget=False)
+        self.evict_faded(now)
+        self.enforce_budget(now)
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path) as f:
+            return cls(json.load(f), **kwargs)
+
+    def record(self, context_key, title, reward, count=1, timestamp=None, enforce_budget=True):
+        """Add reward/count for a title to its context and every rollup above it."""
+        timestamp = timestamp or time.time()
+        self.version = next(_versions)
+        key_parts = context_key.split("|")
+        bucket = self.contexts.setdefault(context_key, {})
+        if title not in bucket:
+            self.arm_count += 1
+        self._add(bucket, title, reward, count, timestamp)
+        if len(key_parts) == 5:
+            # Legacy 4-part keys can't be placed in the hierarchy, keep them exact-match only
+            for level, positions in ROLLUP_LEVELS:
+                rollup = self.rollups[level].setdefault(rollup_key(key_parts, positions), {})
+                self._add(rollup, title, reward, count, timestamp)
+        if enforce_budget:
+            self.enforce_budget(timestamp)
+
+    def replace_context(self, context_key, movies, timestamp=None):
+        """Swap a whole context for a fresh copy (e.g. from Firestore), keeping rollups in step."""
+        timestamp = timestamp or time.time()
+        self.remove_context(context_key, timestamp)
+        for title, entry in movies.items():
+            self.record(context_key, title, entry.get("reward", 0), entry.get("count", 0),
+                        timestamp=timestamp, enforce_budget=False)
+        self.enforce_budget(timestamp)
+
+    def remove_context(self, context_key, timestamp=None):
+        timestamp = timestamp or time.time()
+        for title in list(self.contexts.get(context_key, {})):
+            self._evict_arm(context_key, title, timestamp)
+            self.evicted_arms -= 1  # a replacement, not a budget eviction
+
+    def get(self, context_key):
+        return self._decayed(self.contexts.get(context_key, {}), time.time())
+
+    def lookup(self, context_key):
+        """
+        Returns (stats, level) for the most specific level that has data,
+        where level is "exact" or one of the ROLLUP_LEVELS names.
+        """
+        stats, level = self._find(context_key)
+        if stats is None:
+            return {}, None
+        return self._decayed(stats, time.time()), level
+
+    def peek(self, context_key):
+        """
+        lookup() without writing to the store: decayed copies of the entries
+        (or, with decay off, the bucket itself - treat it as read-only).
+        """
+        stats, level = self._find(context_key)
+        if stats is None:
+            return {}, None
+        if not self.half_life_seconds:
+            return stats, level
+        now = time.time()
+        decayed = {}
+        for title, entry in stats.items():
+            factor = self._decay_factor(entry, now)
+            decayed[title] = {"reward": entry["reward"] * factor, "count": entry["count"] * factor,
+                              "updated": max(entry["updated"], now)}
+        return decayed, level
+
+    def copy_for_update(self, context_keys):
+        """
+        A new store that shares every bucket with this one except those the
+        given context keys write to (their context and the rollups above it),
+        which are copied - recording those keys into the copy leaves this
+        store untouched.
+        """
+        clone = StatsStore(half_life_seconds=self.half_life_seconds, max_arms=self.max_arms,
+                           min_arm_weight=self.min_arm_weight)
+        clone.contexts = dict(self.contexts)
+        clone.rollups = {level: dict(buckets) for level, buckets in self.rollups.items()}
+        clone.arm_count = self.arm_count
+        clone.evicted_arms = self.evicted_arms
+        copied = set()
+        for context_key in context_keys:
+            if context_key in clone.contexts:
+                clone.contexts[context_key] = _copy_bucket(clone.contexts[context_key])
+            key_parts = context_key.split("|")
+            if len(key_parts) != 5:
+                continue
+            for level, positions in ROLLUP_LEVELS:
+                key = rollup_key(key_parts, positions)
+                if key in clone.rollups[level] and (level, key) not in copied:
+                    clone.rollups[level][key] = _copy_bucket(clone.rollups[level][key])
+                    copied.add((level, key))
+        return clone
+
+    def evict_faded(self, now=None):
+        """Evict every arm whose decayed weight has dropped below min_arm_weight."""
+        if not self.half_life_seconds:
+            return
+        now = now or time.time()
+        victims = [(context_key, title) for context_key, bucket in self.contexts.items()
+                   for title, entry in bucket.items()
+                   if self._decay_factor(entry, now) * entry["count"] < self.min_arm_weight]
+        for context_key, title in victims:
+            self._evict_arm(context_key, title, now)
+        if victims:
+            print(f"🧹 Evicted {len(victims)} faded bandit arms; {self.arm_count} arms remain.")
+
+    def enforce_budget(self, now=None):
+        """Evict faded arms, then the least-weighted ones if we are over max_arms."""
+        if not self.max_arms or self.arm_count <= self.max_arms:
+            return
+        now = now or time.time()
+        # Evict down to 90% of the budget so the sweep is amortized over many records
+        target = int(self.max_arms * 0.9)
+        arms = []
+        for context_key, bucket in self.contexts.items():
+            for title, entry in bucket.items():
+                arms.append((self._decay_factor(entry, now) * entry["count"], context_key, title))
+        faded = [arm for arm in arms if arm[0] < self.min_arm_weight]
+        excess = max(0, self.arm_count - target - len(faded))
+        victims = faded + heapq.nsmallest(excess, (arm for arm in arms if arm[0] >= self.min_arm_weight))
+        for _, context_key, title in victims:
+            self._evict_arm(context_key, title, now)
+        print(f"🧹 Evicted {len(victims)} bandit arms; {self.arm_count} arms in {len(self.contexts)} contexts remain.")
+
+    def info(self):
+        return {
+            "contexts": len(self.contexts),
+            "arms": self.arm_count,
+            "max_arms": self.max_arms,
+            "evicted_arms": self.evicted_arms,
+            "half_life_seconds": self.half_life_seconds,
+        }
+
+    def _find(self, context_key):
+        stats = self.contexts.get(context_key)
+        if stats:
+            return stats, "exact"
+        key_parts = context_key.split("|")
+        if len(key_parts) != 5:
+            return None, None
+        for level, positions in ROLLUP_LEVELS:
+            stats = self.rollups[level].get(rollup_key(key_parts, positions))
+            if stats:
+                return stats, level
+        return None, None
+
+    def _decay_factor(self, entry, now):
+        elapsed = now - entry["updated"]
+        if not self.half_life_seconds or elapsed <= 0:
+            return 1.0
+        return 0.5 ** (elapsed / self.half_life_seconds)
+
+    def _decay(self, entry, now):
+        factor = self._decay_factor(entry, now)
+        if factor != 1.0:
+            entry["reward"] *= factor
+            entry["count"] *= factor
+        entry["updated"] = max(entry["updated"], now)
+
+    def _decayed(self, bucket, now):
+        if self.half_life_seconds:
+            for entry in bucket.values():
+                self._decay(entry, now)
+        return bucket
+
+    def _add(self, bucket, title, reward, count, timestamp):
+        entry = bucket.get(title)
+        if entry is None:
+            bucket[title] = {"reward": reward, "count": count, "updated": timestamp}
+            return
+        if timestamp >= entry["updated"]:
+            self._decay(entry, timestamp)
+        else:
+            # An older observation (e.g. merging arms into a rollup): age it instead
+            factor = 0.5 ** ((entry["updated"] - timestamp) / self.half_life_seconds) if self.half_life_seconds else 1.0
+            reward, count = reward * factor, count * factor
+        entry["reward"] += reward
+        entry["count"] += count
+
+    def _evict_arm(self, context_key, title, now):
+        bucket = self.contexts[context_key]
+        entry = bucket.pop(title)
+        self._decay(entry, now)
+        self.version = next(_versions)
+        self.arm_count -= 1
+        self.evicted_arms += 1
+        if not bucket:
+            del self.contexts[context_key]  # dead context
+
+        key_parts = context_key.split("|")
+        if len(key_parts) != 5:
+            return
+        # Take the evicted arm's weight back out of the rollups it fed
+        for level, positions in ROLLUP_LEVELS:
+            key = rollup_key(key_parts, positions)
+            rollup = self.rollups[level].get(key)
+            rolled = rollup.get(title) if rollup else None
+            if rolled is None:
+                continue
+            self._decay(rolled, now)
+            rolled["reward"] -= entry["reward"]
+            rolled["count"] -= entry["count"]
+            if rolled["count"] < self.min_arm_weight:
+                del rollup[title]
+                if not rollup:
+                    del self.rollups[level][key]
+
+
+class _Shard:
+    __slots__ = ("lock", "pending")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}  # (context_key, title) -> [reward, count]
+
+
+class SnapshotStats:
+    """
+    Read-copy-update access to a StatsStore for the threaded API.
+
+    Readers take the current snapshot reference and read it without locking;
+    a published snapshot is never written to again. record() only adds to the
+    pending counters of the writing thread's shard (threads are spread over the
+    shards round-robin, so writers rarely share a lock). A background merger
+    folds the pending counters into a copy of the snapshot every merge_interval
+    seconds - copying just the buckets they touch - and publishes the copy by
+    swapping the reference. Recorded feedback is visible to readers after the
+    next merge.
+    """
+
+    def __init__(self, store, shards=16, merge_interval=1.0):
+        self._snapshot = store
+        self._shards = [_Shard() for _ in range(max(1, shards))]
+        self._next_shard = itertools.count()
+        self._local = threading.local()
+        self.merge_interval = merge_interval
+        self._merge_lock = threading.Lock()  # one merge at a time
+        self._merger = None
+        self._stop = threading.Event()
+        self.merges = 0
+        self.merged_increments = 0
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    def snapshot(self):
+        """The current StatsStore; read-only."""
+        return self._snapshot
+
+    def lookup(self, context_key):
+        return self._snapshot.peek(context_key)
+
+    def record(self, context_key, title, reward, count=1):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = self._shards[next(self._next_shard) % len(self._shards)]
+        with shard.lock:
+            pending = shard.pending.get((context_key, title))
+            if pending is None:
+                shard.pending[(context_key, title)] = [reward, count]
+            else:
+                pending[0] += reward
+                pending[1] += count
+        if self._merger is None:
+            self._start_merger()
+
+    def merge(self):
+        """Fold every pending increment into a new snapshot and publish it."""
+        with self._merge_lock:
+            increments = {}
+            for shard in self._shards:
+                with shard.lock:
+                    batch, shard.pending = shard.pending, {}
+                for key, (reward, count) in batch.items():
+                    total = increments.get(key)
+                    if total is None:
+                        increments[key] = [reward, count]
+                    else:
+                        total[0] += reward
+                        total[1] += count
+            if not increments:
+                return 0
+
+            now = time.time()
+            store = self._snapshot.copy_for_update({context_key for context_key, _ in increments})
+            for (context_key, title), (reward, count) in increments.items():
+                store.record(context_key, title, reward, count, timestamp=now, enforce_budget=False)
+            if store.max_arms and store.arm_count > store.max_arms:
+                # Budget evictions can hit any bucket, so they work on a full copy
+                store = store.copy_for_update(list(store.contexts))
+                store.enforce_budget(now)
+            self._snapshot = store  # publish: readers pick it up on their next lookup
+            self.merges += 1
+            self.merged_increments += len(increments)
+            return len(increments)
+
+    def replace(self, store):
+        """Publish a freshly loaded store; increments still pending are merged into it."""
+        with self._merge_lock:
+            self._snapshot = store
+
+    def stop(self):
+        self._stop.set()
+        if self._merger is not None:
+            self._merger.join(timeout=5)
+        self.merge()
+
+    def info(self):
+        info = self._snapshot.info()
+        info.update({
+            "version": self._snapshot.version,
+            "merges": self.merges,
+            "merged_increments": self.merged_increments,
+            "pending_increments": sum(len(shard.pending) for shard in self._shards),
+        })
+        return info
+
+    def _start_merger(self):
+        with self._merge_lock:
+            if self._merger is not None:
+                return
+            self._merger = threading.Thread(target=self._merge_loop, name="bandit-stats-merger", daemon=True)
+            self._merger.start()
+
+    def _merge_loop(self):
+        while not self._stop.wait(self.merge_interval):
+            try:
+                self.merge()
+            except Exception as e:
+                print(f"❌ Bandit stats merge failed: {e}")
+
+
+class StatsFileLoader:
+    """
+    Builds a StatsStore from the newest existing stats file and rebuilds it when
+    that file changes. Candidate paths let a compacted artifact take over from
+    bandit_stats.json for as long as it is the fresher of the two. get() returns
+    a SnapshotStats over it; reloads are published into the same SnapshotStats.
+    """
+
+    def __init__(self, *paths, merge_interval=1.0, **store_kwargs):
+        self.paths = paths
+        self.merge_interval = merge_interval
+        self.store_kwargs = store_kwargs
+        self._stats = None
+        self._source = None
+
+    def get(self):
+        newest = None
+        for path in self.paths:
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            if newest is None or mtime > newest[0]:
+                newest = (mtime, path)
+        if newest is None:
+            return self._stats
+        if self._stats is None or newest != self._source:
+            store = StatsStore.from_file(newest[1], **self.store_kwargs)
+            if self._stats is None:
+                self._stats = SnapshotStats(store, merge_interval=self.merge_interval)
+            else:
+                self._stats.replace(store)
+            self._source = newest
+            print(f"✅ Loaded bandit stats for {len(store.contexts)} contexts from {os.path.basename(newest[1])}.")
+        return self._stats
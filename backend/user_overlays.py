@@ -0,0 +1,253 @@
+"""
+Per-user personalization overlays for the contextual bandit.
+
+Each known user gets a small {title: [reward, count]} overlay that is blended
+with the shared context stats when movies are scored. Overlays live in a
+bounded in-memory LRU store; users that go cold (pushed out by capacity or
+idle past the TTL) are simply dropped and reloaded lazily from Firestore the
+next time they ask for recommendations.
+
+Feedback is never written by overwriting a user's document. Each record() also
+adds to a pending delta, and a background flusher writes the deltas as
+Increment merges into the UserOverlays collection. If a load fails (Firestore
+down, breaker open) the overlay is kept as "not loaded" and the load is
+retried on the next request; feedback recorded meanwhile still lands in
+Firestore as increments on top of whatever is stored.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from google.cloud import firestore as gcloud_firestore
+
+from circuit_breaker import CircuitOpenError, call_through
+from firestore_utils import MAX_BATCH_WRITES, valid_document_id
+
+USER_OVERLAYS_COLLECTION = "UserOverlays"
+
+# Shared ids used by the frontend before login - personalizing them would just
+# build a second global stats table, so they never get an overlay.
+ANONYMOUS_USER_IDS = {"", "guest", "default_user"}
+
+
+class _Overlay:
+    __slots__ = ("titles", "last_access", "loaded")
+
+    def __init__(self, titles=None, loaded=False):
+        self.titles = titles or {}  # title -> [reward, count]
+        self.last_access = time.monotonic()
+        self.loaded = loaded  # False until a Firestore read for the user succeeded
+
+
+class UserOverlayStore:
+    """Bounded LRU (+ optional idle TTL) cache of per-user reward overlays."""
+
+    def __init__(self, db=None, capacity=10000, ttl_seconds=None, max_titles_per_user=200,
+                 collection=USER_OVERLAYS_COLLECTION, breaker=None, flush_interval=1.0, timeout=None):
+        self.db = db
+        self.breaker = breaker
+        self.timeout = timeout  # seconds per Firestore call; get() runs on the /recommend path
+        self.capacity = max(1, capacity)
+        self.ttl_seconds = ttl_seconds
+        self.max_titles_per_user = max_titles_per_user
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self._overlays = OrderedDict()  # user_id -> _Overlay, oldest access first
+        self._pending = {}  # user_id -> {title: [reward, count]} not yet written to Firestore
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._stop = threading.Event()
+        self.evictions = 0
+        self.loads = 0
+        self.failed_loads = 0
+        self.flushed_writes = 0
+
+    def get(self, user_id):
+        """Return the user's {title: [reward, count]} overlay, or None for anonymous users."""
+        if user_id in ANONYMOUS_USER_IDS or not valid_document_id(user_id):
+            return None
+
+        with self._lock:
+            overlay = self._overlays.get(user_id)
+            if overlay is not None:
+                overlay.last_access = time.monotonic()
+                self._overlays.move_to_end(user_id)
+                if overlay.loaded or not self.db:
+                    return overlay.titles
+
+        # Cold (or previously failed) user: load outside the lock so one slow read doesn't block everyone
+        stored = self._load(user_id)
+        with self._lock:
+            overlay = self._overlays.get(user_id)
+            if overlay is None:
+                overlay = self._overlays[user_id] = _Overlay()
+            if stored is not None and not overlay.loaded:
+                # Stored history plus whatever this instance recorded that isn't written yet
+                titles = stored
+                for title, (reward, count) in self._pending.get(user_id, {}).items():
+                    entry = titles.setdefault(title, [0.0, 0])
+                    entry[0] += reward
+                    entry[1] += count
+                overlay.titles = self._strongest(titles)
+                overlay.loaded = True
+            overlay.last_access = time.monotonic()
+            self._overlays.move_to_end(user_id)
+            self._evict_locked()
+            return overlay.titles
+
+    def record(self, user_id, title, reward):
+        """Add one reward observation for a title to the user's overlay."""
+        if user_id in ANONYMOUS_USER_IDS or not valid_document_id(user_id):
+            return
+        self.get(user_id)  # make sure the overlay is resident
+        with self._lock:
+            overlay = self._overlays.get(user_id)
+            if overlay is None:
+                # Evicted between get() and here under heavy churn; start fresh (and reload later)
+                overlay = self._overlays[user_id] = _Overlay()
+            entry = overlay.titles.get(title)
+            if entry is None:
+                if len(overlay.titles) >= self.max_titles_per_user:
+                    # Drop the least-observed title to keep each overlay bounded
+                    weakest = min(overlay.titles, key=lambda t: overlay.titles[t][1])
+                    del overlay.titles[weakest]
+                entry = overlay.titles[title] = [0.0, 0]
+            entry[0] += reward
+            entry[1] += 1
+            delta = self._pending.setdefault(user_id, {}).setdefault(title, [0.0, 0])
+            delta[0] += reward
+            delta[1] += 1
+            overlay.last_access = time.monotonic()
+            self._overlays.move_to_end(user_id)
+            self._evict_locked()
+        if self.db and self._flusher is None:
+            self._start_flusher()
+
+    def flush(self):
+        """Write every pending delta as Increment merges (also used on shutdown)."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not self.db or not pending:
+            return
+        # Ids that Firestore would reject can never be written; drop them rather than
+        # requeueing them forever and failing every other write in their batch
+        items = [(user_id, titles) for user_id, titles in pending.items() if valid_document_id(user_id)]
+        if len(items) < len(pending):
+            print(f"❌ Dropping overlay updates for {len(pending) - len(items)} invalid user id(s)")
+        for start in range(0, len(items), MAX_BATCH_WRITES):
+            chunk = []
+            batch = self.db.batch()
+            for user_id, titles in items[start:start + MAX_BATCH_WRITES]:
+                try:
+                    batch.set(self.db.collection(self.collection).document(user_id), {
+                        "titles": {
+                            title: {
+                                "reward": gcloud_firestore.Increment(reward),
+                                "count": gcloud_firestore.Increment(count),
+                            }
+                            for title, (reward, count) in titles.items()
+                        },
+                        "timestamp": datetime.now(),
+                    }, merge=True)
+                    chunk.append((user_id, titles))
+                except ValueError as e:
+                    print(f"❌ Dropping overlay updates for {user_id!r}: {e}")
+            if not chunk:
+                continue
+            try:
+                call_through(self.breaker, batch.commit, timeout=self.timeout)
+                self.flushed_writes += len(chunk)
+            except CircuitOpenError:
+                self._requeue(chunk)
+            except Exception as e:
+                print(f"❌ Firestore Error: Failed to write user overlays, will retry: {e}")
+                self._requeue(chunk)
+
+    def stop(self):
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+        self.flush()
+
+    def info(self):
+        with self._lock:
+            return {
+                "resident_users": len(self._overlays),
+                "capacity": self.capacity,
+                "ttl_seconds": self.ttl_seconds,
+                "evictions": self.evictions,
+                "loads": self.loads,
+                "failed_loads": self.failed_loads,
+                "pending_users": len(self._pending),
+                "flushed_writes": self.flushed_writes,
+            }
+
+    def _evict_locked(self):
+        # Nothing to write on eviction: every recorded delta is already in _pending
+        evicted = 0
+        if self.ttl_seconds:
+            cutoff = time.monotonic() - self.ttl_seconds
+            # Oldest access is always at the front, so stop at the first warm user
+            while self._overlays:
+                overlay = next(iter(self._overlays.values()))
+                if overlay.last_access >= cutoff:
+                    break
+                self._overlays.popitem(last=False)
+                evicted += 1
+        while len(self._overlays) > self.capacity:
+            self._overlays.popitem(last=False)
+            evicted += 1
+        self.evictions += evicted
+
+    def _load(self, user_id):
+        """The stored overlay ({} if the user has none), or None if it could not be read."""
+        if not self.db:
+            return None
+        try:
+            snapshot = call_through(self.breaker, self.db.collection(self.collection).document(user_id).get,
+                                    timeout=self.timeout)
+            self.loads += 1
+            if not snapshot.exists:
+                return {}
+            stored = (snapshot.to_dict() or {}).get("titles", {})
+            return {title: [float(v.get("reward", 0)), int(v.get("count", 0))]
+                    for title, v in stored.items() if isinstance(v, dict)}
+        except CircuitOpenError:
+            self.failed_loads += 1
+            return None
+        except Exception as e:
+            print(f"❌ Firestore Error: Failed to load overlay for {user_id}: {e}")
+            self.failed_loads += 1
+            return None
+
+    def _strongest(self, titles):
+        """Firestore keeps every title ever incremented; hold only the most observed ones."""
+        if len(titles) <= self.max_titles_per_user:
+            return titles
+        strongest = sorted(titles, key=lambda t: titles[t][1], reverse=True)[:self.max_titles_per_user]
+        return {title: titles[title] for title in strongest}
+
+    def _requeue(self, chunk):
+        with self._lock:
+            for user_id, titles in chunk:
+                pending = self._pending.setdefault(user_id, {})
+                for title, (reward, count) in titles.items():
+                    delta = pending.setdefault(title, [0.0, 0])
+                    delta[0] += reward
+                    delta[1] += count
+
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="user-overlay-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ User overlay flush failed: {e}")
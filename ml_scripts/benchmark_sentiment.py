@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Local Sentiment Benchmark
+
+Compares backend/sentiment.py against recorded AWS Comprehend labels and
+measures its latency. Labels come from either:
+
+- a JSON list or JSON Lines file of {"text": ..., "label": ..., "source": ...}
+  rows ("source" optional), or
+- the UserMoods collection (--firestore): every document whose mood_source is
+  "comprehend" or "comprehend_audit" gives raw_inputs.mood_response ->
+  context.mood (--export PATH saves those rows in the file format above)
+
+Reports overall agreement, a confusion matrix, single-text and batch latency,
+and a confidence-threshold sweep showing, for SENTIMENT_MODE=prefilter, how
+many texts the local model would answer by itself and how well it agrees with
+Comprehend on them.
+
+Label bias: under SENTIMENT_MODE=prefilter only the texts the model was unsure
+about reach Comprehend, so "comprehend" rows over-represent hard texts. The
+API also sends a SENTIMENT_AUDIT_RATE sample of confident texts to Comprehend
+("comprehend_audit"); those rows are weighted by 1 / --audit-rate so every
+figure (and --fit) estimates the full traffic mix. Labels collected under
+SENTIMENT_MODE=comprehend are unbiased; use --audit-rate 1 for them.
+
+--fit refits the model's 4x4 linear layer (sentiment.fit_weights) on 80% of
+the rows and compares the held-out agreement of the fitted and default
+weights; --save-weights PATH stores them for SENTIMENT_WEIGHTS_PATH.
+
+Usage:
+    python benchmark_sentiment.py --labels comprehend_labels.jsonl
+    python benchmark_sentiment.py --firestore --export comprehend_labels.jsonl
+    python benchmark_sentiment.py --labels comprehend_labels.jsonl --fit --save-weights sentiment_weights.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.join(script_dir, "../backend")
+sys.path.insert(0, backend_dir)
+
+from sentiment import LABELS, SentimentModel, fit_weights
+
+AUDIT_SOURCE = "comprehend_audit"
+THRESHOLDS = (0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95)
+
+
+def load_label_file(path):
+    with open(path) as f:
+        content = f.read().strip()
+    if content.startswith("["):
+        rows = json.loads(content)
+    else:
+        rows = [json.loads(line) for line in content.splitlines() if line.strip()]
+    return [(row["text"], row["label"].capitalize(), row.get("source", "comprehend"))
+            for row in rows if row.get("text") and row.get("label")]
+
+
+def load_firestore_labels():
+    from firestore_utils import init_firestore
+
+    db = init_firestore()
+    rows = []
+    for doc in db.collection("UserMoods").where("mood_source", "in", ["comprehend", AUDIT_SOURCE]).stream():
+        data = doc.to_dict() or {}
+        text = (data.get("raw_inputs") or {}).get("mood_response")
+        label = (data.get("context") or {}).get("mood")
+        if text and label:
+            rows.append((text, label.capitalize(), data["mood_source"]))
+    return rows
+
+
+def row_weights(rows, audit_rate):
+    """Audit rows stand for 1 / audit_rate confident texts each; other rows for one text."""
+    return [1.0 / audit_rate if source == AUDIT_SOURCE else 1.0 for _, _, source in rows]
+
+
+def weighted_share(flags, weights):
+    total = sum(weights)
+    return sum(w for flag, w in zip(flags, weights) if flag) / total if total else None
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def benchmark(rows, model, audit_rate=1.0):
+    texts = [text for text, _, _ in rows]
+    labels = [label for _, label, _ in rows]
+    weights = row_weights(rows, audit_rate)
+
+    # Latency: one text at a time (the API path) and one vectorized batch
+    single = []
+    for text in texts:
+        start = time.perf_counter()
+        model.predict(text)
+        single.append((time.perf_counter() - start) * 1e6)
+    single.sort()
+    start = time.perf_counter()
+    predictions = model.predict_batch(texts)
+    batch_us = (time.perf_counter() - start) * 1e6 / len(texts)
+
+    agree = [predicted == label for (predicted, _), label in zip(predictions, labels)]
+    confusion = Counter((label, predicted) for (predicted, _), label in zip(predictions, labels))
+
+    sweep = []
+    for threshold in THRESHOLDS:
+        confident = [confidence >= threshold for _, confidence in predictions]
+        local = [(ok, w) for ok, w, is_local in zip(agree, weights, confident) if is_local]
+        sweep.append({
+            "threshold": threshold,
+            "handled_locally": weighted_share(confident, weights),
+            "local_agreement": weighted_share(*zip(*local)) if local else None,
+            # Routed texts get Comprehend's own label, so they always agree
+            "overall_agreement": weighted_share([ok or not is_local for ok, is_local in zip(agree, confident)], weights),
+        })
+
+    by_source = {}
+    for source in sorted({source for _, _, source in rows}):
+        flags = [ok for ok, (_, _, row_source) in zip(agree, rows) if row_source == source]
+        by_source[source] = {"texts": len(flags), "agreement": sum(flags) / len(flags)}
+
+    return {
+        "texts": len(rows),
+        "agreement": weighted_share(agree, weights),
+        "by_source": by_source,
+        "label_counts": dict(Counter(labels)),
+        "confusion": {f"{label}->{predicted}": count for (label, predicted), count in sorted(confusion.items())},
+        "latency_us": {
+            "single_p50": round(percentile(single, 50), 1),
+            "single_p99": round(percentile(single, 99), 1),
+            "batch_per_text": round(batch_us, 2),
+        },
+        "threshold_sweep": sweep,
+    }
+
+
+def fit(rows, audit_rate, holdout=0.2, seed=0):
+    """Fits the linear layer on part of the rows; returns (weights, held-out report)."""
+    rows = list(rows)
+    random.Random(seed).shuffle(rows)
+    split = max(1, int(len(rows) * (1 - holdout)))
+    train, test = rows[:split], rows[split:] or rows[:split]
+    default_model = SentimentModel()
+    weights = fit_weights(default_model, [text for text, _, _ in train], [label for _, label, _ in train],
+                          sample_weights=row_weights(train, audit_rate))
+    fitted_model = SentimentModel(weights=weights)
+    test_weights = row_weights(test, audit_rate)
+    result = {"train": len(train), "test": len(test)}
+    for name, model in (("default", default_model), ("fitted", fitted_model)):
+        predictions = model.predict_batch([text for text, _, _ in test])
+        result[f"{name}_agreement"] = weighted_share(
+            [predicted == label for (predicted, _), (_, label, _) in zip(predictions, test)], test_weights)
+    return weights, result
+
+
+def print_report(report):
+    print(f"\n📊 {report['texts']} texts, agreement with Comprehend: {report['agreement']:.1%}")
+    print(f"   Labels: {report['label_counts']}")
+    for source, row in report["by_source"].items():
+        print(f"   {source}: {row['texts']} texts, {row['agreement']:.1%} agreement")
+
+    labels = [label for label in LABELS if any(key.startswith(label + "->") or key.endswith("->" + label)
+                                               for key in report["confusion"])]
+    print("\nConfusion (rows = Comprehend, columns = local):")
+    print(f"{'':>10}" + "".join(f"{label:>10}" for label in labels))
+    for label in labels:
+        print(f"{label:>10}" + "".join(f"{report['confusion'].get(f'{label}->{predicted}', 0):>10}" for predicted in labels))
+
+    latency = report["latency_us"]
+    print(f"\n⏱️ Single text: p50 {latency['single_p50']}µs, p99 {latency['single_p99']}µs; "
+          f"batch: {latency['batch_per_text']}µs per text")
+
+    print("\nPrefilter threshold sweep:")
+    print(f"{'threshold':>10}{'local':>10}{'local agree':>14}{'overall':>10}")
+    for row in report["threshold_sweep"]:
+        local_agreement = f"{row['local_agreement']:.1%}" if row["local_agreement"] is not None else "-"
+        print(f"{row['threshold']:>10}{row['handled_locally']:>10.1%}{local_agreement:>14}{row['overall_agreement']:>10.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the local sentiment model against Comprehend labels")
+    parser.add_argument("--labels", default=None, help="JSON / JSON Lines file of {text, label} rows")
+    parser.add_argument("--firestore", action="store_true", help="read Comprehend-labelled rows from UserMoods")
+    parser.add_argument("--export", default=None, help="with --firestore, also save the rows as JSON Lines")
+    parser.add_argument("--json", default=None, help="also write the report to this file")
+    parser.add_argument("--audit-rate", type=float, default=float(os.getenv("SENTIMENT_AUDIT_RATE", "0.02")),
+                        help="share of confident texts the API audits (weights comprehend_audit rows)")
+    parser.add_argument("--fit", action="store_true", help="refit the linear layer on the labelled rows")
+    parser.add_argument("--save-weights", default=None, help="with --fit, write the weights here")
+    args = parser.parse_args()
+
+    if args.firestore:
+        rows = load_firestore_labels()
+        if args.export:
+            with open(args.export, "w") as f:
+                for text, label, source in rows:
+                    f.write(json.dumps({"text": text, "label": label, "source": source}) + "\n")
+            print(f"💾 Exported {len(rows)} rows to {args.export}")
+    elif args.labels:
+        rows = load_label_file(args.labels)
+    else:
+        parser.error("pass --labels FILE or --firestore")
+
+    if not rows:
+        print("❌ No labelled texts found.")
+        sys.exit(1)
+
+    report = benchmark(rows, SentimentModel(), args.audit_rate)
+    print_report(report)
+    if args.fit:
+        weights, result = fit(rows, args.audit_rate)
+        report["fit"] = dict(result, weights=weights.tolist())
+        print(f"\n🧮 Fitted on {result['train']} texts; held-out agreement on {result['test']}: "
+              f"default {result['default_agreement']:.1%}, fitted {result['fitted_agreement']:.1%}")
+        print(np.array2string(weights, precision=2, suppress_small=True))
+        if args.save_weights:
+            with open(args.save_weights, "w") as f:
+                json.dump({"labels": list(LABELS), "weights": weights.tolist()}, f, indent=2)
+            print(f"💾 Weights saved to {args.save_weights} (set SENTIMENT_WEIGHTS_PATH to use them)")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
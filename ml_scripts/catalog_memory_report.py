@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Catalog Memory Report
+
+Compares the memory retained by the API's whole Catalog - movies, title index,
+pre-encoded JSON and the content-similarity matrix - with movies held as plain
+dicts (the default) and as the compact MovieRecords enabled by
+CATALOG_COMPACT=1. The catalog can be replicated to estimate a large deployment.
+
+Usage:
+    python catalog_memory_report.py [--scale 1000]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(script_dir, "../backend"))
+
+from catalog import memory_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare dict vs compact catalog memory")
+    parser.add_argument("--scale", type=int, default=1,
+                        help="replicate the catalog this many times (titles are made unique)")
+    args = parser.parse_args()
+
+    with open(os.path.join(script_dir, "../data/movies.json"), "r", encoding="utf-8") as f:
+        movies = json.load(f)
+    if args.scale > 1:
+        movies = [dict(movie, title=f"{movie['title']} #{i}") for i in range(args.scale) for movie in movies]
+
+    report = memory_report(movies)
+    print("📊 Catalog Memory Report")
+    print("=" * 50)
+    print(f"Movies:            {report['movies']}")
+    print(f"{'':<18}{'plain dicts':>14}{'compact':>14}")
+    for part in report["breakdown"]["dict"]:
+        print(f"{part:<18}" + "".join(f"{report['breakdown'][mode][part] / 1024:>10.1f} KiB"
+                                      for mode in ("dict", "compact")))
+    print(f"Saved:             {report['saved_pct']}%")
+    print(f"Distinct tags:     {report['distinct_tags']}")
+    print(f"URL prefixes:      {report['url_prefixes']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Compact Bandit Stats Script
+
+Canonicalizes and compacts bandit_stats.json into a smaller artifact that the
+API loads in preference to the raw file (data/bandit_stats.compact.json):
+
+- legacy 4-part keys (mood|intent|weather|time) gain an empty sub_intent slot
+- mood synonyms ("Happy", "Good", "Sad", ...) are mapped onto the labels the
+  API can actually produce (Comprehend's Positive/Negative/Neutral/Mixed)
+- contexts that can never be generated (unknown intent or time of day, a
+  sub-intent outside Focus, no mood mapping) and titles missing from
+  movies.json are dropped
+- duplicate contexts produced by the mapping are merged by summing counters
+- every arm is written decayed to the time of compaction with an `updated`
+  timestamp, and arms that have faded away are dropped. Re-compacting the
+  previous compact output (--input) carries decay forward, so it survives API
+  restarts; the raw, undated bandit_stats.json starts decaying when loaded
+
+Optionally folds feedback.json in as extra observations (its rows use
+`timeOfDay`, which is normalized like everything else).
+
+Usage:
+    python compact_bandit_stats.py [--feedback ../data/feedback.json] [--output PATH]
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import Counter
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INPUT = os.path.join(script_dir, "../data/bandit_stats.json")
+DEFAULT_OUTPUT = os.path.join(script_dir, "../data/bandit_stats.compact.json")
+MOVIES_PATH = os.path.join(script_dir, "../data/movies.json")
+
+# Labels _generate_context_logic can emit (Comprehend sentiment, capitalized)
+MOODS = {"Positive", "Negative", "Neutral", "Mixed"}
+MOOD_SYNONYMS = {
+    "happy": "Positive", "good": "Positive", "great": "Positive", "excited": "Positive", "amazing": "Positive",
+    "sad": "Negative", "bad": "Negative", "angry": "Negative", "terrible": "Negative", "stressed": "Negative",
+    "calm": "Neutral", "okay": "Neutral", "ok": "Neutral",
+}
+INTENTS = {"Entertainment", "Relaxation", "Focus"}
+SUB_INTENTS = {"Workout", "Cooking"}  # only ever paired with Focus
+TIMES_OF_DAY = {"Morning", "Afternoon", "Evening", "Night"}
+MIN_ARM_WEIGHT = 0.01  # StatsStore's default min_arm_weight
+
+
+def canonical_mood(mood):
+    mood = (mood or "").strip()
+    if mood.capitalize() in MOODS:
+        return mood.capitalize()
+    return MOOD_SYNONYMS.get(mood.lower())
+
+
+def canonical_context(context):
+    """
+    Returns the canonical 5-part key for a context dict, or (None, reason) when
+    the API could never generate that context.
+    """
+    mood = canonical_mood(context.get("mood"))
+    if mood is None:
+        return None, "mood"
+    intent = (context.get("intent") or "").strip().capitalize()
+    if intent not in INTENTS:
+        return None, "intent"
+    sub_intent = (context.get("sub_intent") or "").strip().capitalize()
+    if sub_intent and (intent != "Focus" or sub_intent not in SUB_INTENTS):
+        return None, "sub_intent"
+    weather = (context.get("weather") or "").strip()
+    if not weather or weather.lower() == "any":
+        return None, "weather"
+    time_of_day = (context.get("time_of_day") or context.get("timeOfDay") or "").strip().capitalize()
+    if time_of_day not in TIMES_OF_DAY:
+        return None, "time_of_day"
+    return f"{mood}|{intent}|{sub_intent}|{weather}|{time_of_day}", None
+
+
+def parse_key(context_key):
+    parts = context_key.split("|")
+    if len(parts) == 4:
+        # Legacy key from before sub_intent existed
+        mood, intent, weather, time_of_day = parts
+        sub_intent = ""
+    elif len(parts) == 5:
+        mood, intent, sub_intent, weather, time_of_day = parts
+    else:
+        return None
+    return {"mood": mood, "intent": intent, "sub_intent": sub_intent,
+            "weather": weather, "time_of_day": time_of_day}
+
+
+def decay_factor(updated, now, half_life_seconds):
+    if not half_life_seconds or updated >= now:
+        return 1.0
+    return 0.5 ** ((now - updated) / half_life_seconds)
+
+
+def add_arm(compacted, context_key, title, reward, count, updated, now, half_life_seconds):
+    """Adds an observation decayed from `updated` to `now`, so merged arms share one timestamp."""
+    factor = decay_factor(updated, now, half_life_seconds)
+    arm = compacted.setdefault(context_key, {}).setdefault(title, {"reward": 0, "count": 0, "updated": now})
+    arm["reward"] += reward * factor
+    arm["count"] += count * factor
+
+
+def compact_stats(stats, known_titles, feedback=None, half_life_seconds=None, now=None):
+    """
+    Every arm is written decayed to `now` with updated=now; arms without an
+    `updated` timestamp (raw training output, feedback rows) are taken as of
+    `now`, so their decay starts with the first compaction and then carries
+    over from one compaction to the next. Arms that have faded below
+    MIN_ARM_WEIGHT are dropped, the same rule the API applies on load.
+    """
+    now = now or time.time()
+    compacted = {}
+    dropped = Counter()
+    for context_key, movies in stats.items():
+        context = parse_key(context_key)
+        canonical_key, reason = canonical_context(context) if context else (None, "malformed key")
+        if canonical_key is None:
+            dropped[f"context: {reason}"] += 1
+            continue
+        for title, arm in movies.items():
+            if known_titles is not None and title not in known_titles:
+                dropped["arm: unknown title"] += 1
+                continue
+            add_arm(compacted, canonical_key, title, arm.get("reward", 0), arm.get("count", 0),
+                    arm.get("updated", now), now, half_life_seconds)
+
+    for entry in feedback or []:
+        context = entry.get("context") or entry
+        canonical_key, reason = canonical_context(context)
+        title = entry.get("movie_title")
+        if canonical_key is None or (known_titles is not None and title not in known_titles):
+            dropped["feedback row"] += 1
+            continue
+        add_arm(compacted, canonical_key, title, entry.get("reward", 0), 1,
+                entry.get("updated", now), now, half_life_seconds)
+
+    # Drop arms (and then contexts) that never got a view or have faded away
+    for context_key in list(compacted):
+        movies = {title: arm for title, arm in compacted[context_key].items() if arm["count"] >= MIN_ARM_WEIGHT}
+        if len(movies) < len(compacted[context_key]):
+            dropped["arm: faded or no views"] += len(compacted[context_key]) - len(movies)
+        if movies:
+            compacted[context_key] = movies
+        else:
+            del compacted[context_key]
+            dropped["context: no views"] += 1
+    return compacted, dropped
+
+
+def summarize(stats, size_bytes):
+    return {"bytes": size_bytes, "contexts": len(stats), "arms": sum(len(m) for m in stats.values())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Canonicalize and compact bandit_stats.json")
+    parser.add_argument("--input", default=DEFAULT_INPUT)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--feedback", default=None, help="also fold in a feedback.json file")
+    parser.add_argument("--keep-unknown-titles", action="store_true",
+                        help="keep arms for titles that are not in movies.json")
+    parser.add_argument("--half-life-days", type=float, default=float(os.getenv("BANDIT_HALF_LIFE_DAYS", "30")),
+                        help="decay applied up to now before writing (0 disables)")
+    args = parser.parse_args()
+
+    with open(args.input) as f:
+        stats = json.load(f)
+    feedback = None
+    if args.feedback:
+        with open(args.feedback) as f:
+            feedback = json.load(f)
+    known_titles = None
+    if not args.keep_unknown_titles:
+        with open(MOVIES_PATH, encoding="utf-8") as f:
+            known_titles = {movie["title"] for movie in json.load(f) if isinstance(movie, dict) and "title" in movie}
+
+    compacted, dropped = compact_stats(
+        stats, known_titles, feedback,
+        half_life_seconds=args.half_life_days * 86400 or None,
+    )
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(compacted, f, separators=(",", ":"), sort_keys=True, ensure_ascii=False)
+
+    before = summarize(stats, os.path.getsize(args.input))
+    after = summarize(compacted, os.path.getsize(args.output))
+    print("📊 Bandit Stats Compaction")
+    print("=" * 50)
+    print(f"{'':<10}{'bytes':>12}{'contexts':>10}{'arms':>10}")
+    print(f"{'before':<10}{before['bytes']:>12}{before['contexts']:>10}{before['arms']:>10}")
+    print(f"{'after':<10}{after['bytes']:>12}{after['contexts']:>10}{after['arms']:>10}")
+    if dropped:
+        print("\nDropped:")
+        for reason, count in sorted(dropped.items()):
+            print(f"  {reason}: {count}")
+    print(f"\n💾 Compact stats written to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Scaffolding shared by the checks that run against the Firestore emulator
+(test_firestore_stats.py, test_user_overlays.py, test_precompute_recommendations.py).
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../backend"))
+
+from firestore_utils import init_firestore
+
+
+def emulator_client():
+    """Firestore client for the emulator; exits if FIRESTORE_EMULATOR_HOST is not set."""
+    if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        print("❌ FIRESTORE_EMULATOR_HOST is not set; start the emulator first.")
+        sys.exit(1)
+    return init_firestore()
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def clear_collection(db, name):
+    for doc in db.collection(name).stream():
+        doc.reference.delete()
+
+
+def check(label, ok, detail=""):
+    """Prints one check's result; returns 1 if it failed, for summing into a failure count."""
+    print(f"{label}:", "✅" if ok else f"❌ {detail}".rstrip())
+    return 0 if ok else 1
+
+
+def finish(failures):
+    print("\n🎉 All checks passed!" if not failures else f"\n❌ {failures} check(s) failed")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+End-to-end HTTP Load Test
+
+Starts backend/api.py against local stand-ins for every external dependency
+(a stub wttr.in, a fake AWS Comprehend endpoint and, if gcloud is installed,
+the Firestore emulator; without an emulator Firebase is disabled), then drives /recommend, /generate-context and
+/api/movies with a configurable number of concurrent clients. Request contexts
+are sampled from training_data_bandit.json. Reports throughput plus
+p50/p95/p99 latency per endpoint.
+
+Usage:
+    python load_test.py --concurrency 16 --duration 30
+    python load_test.py --weather-latency-ms 800 --comprehend-latency-ms 300 --jitter-ms 200
+    python load_test.py --target http://localhost:5000   # existing server, no stubs
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from local_stubs import StubServer, free_port, start_firestore_emulator, wait_for_port, weather_ip
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+api_path = os.path.join(script_dir, "../backend/api.py")
+training_path = os.path.join(script_dir, "../data/training_data_bandit.json")
+
+# Text that the API's mood/intent detection maps back onto each context value
+MOOD_TEXT = {
+    "Positive": "I had a great day, feeling happy",
+    "Happy": "I had a great day, feeling happy",
+    "Good": "Pretty good day overall",
+    "Negative": "It was a bad day and I feel sad",
+    "Sad": "It was a bad day and I feel sad",
+    "Neutral": "It was an ordinary day",
+}
+INTENT_TEXT = {
+    "Entertainment": "I want to watch a movie",
+    "Relaxation": "Just want to relax and unwind",
+    "Focus": "I need to focus on work",
+}
+SUB_INTENT_TEXT = {
+    "Workout": "workout at the gym",
+    "Cooking": "cooking dinner in the kitchen",
+}
+
+
+def load_request_mix(users, seed):
+    """Builds (payload, headers) pairs from the recorded training contexts."""
+    with open(training_path) as f:
+        training_data = json.load(f)
+    rng = random.Random(seed)
+    mix = []
+    for entry in training_data:
+        context = entry["context"]
+        payload = {
+            "user_id": f"loadtest_{rng.randrange(users)}",
+            "mood_response": MOOD_TEXT.get(context.get("mood"), "It was an ordinary day"),
+            "activity_response": INTENT_TEXT.get(context.get("intent"), "I want to watch a movie"),
+        }
+        if context.get("sub_intent"):
+            payload["sub_intent_text"] = SUB_INTENT_TEXT.get(context["sub_intent"], "")
+        headers = {"X-Forwarded-For": weather_ip(context.get("weather"))}
+        mix.append((payload, headers))
+    return mix
+
+
+def start_api(port, weather_url, comprehend_url, emulator_host, log_path):
+    env = dict(os.environ)
+    env.update({
+        "PORT": str(port),
+        "FLASK_DEBUG": "0",
+        "WEATHER_API_URL": weather_url,
+        "COMPREHEND_ENDPOINT_URL": comprehend_url,
+        "AWS_ACCESS_KEY_ID": "loadtest",
+        "AWS_SECRET_ACCESS_KEY": "loadtest",
+        "AWS_REGION": "us-east-1",
+    })
+    if emulator_host:
+        env["FIRESTORE_EMULATOR_HOST"] = emulator_host
+    else:
+        # Never let a load test write to whatever Firestore project the shell points at
+        env.pop("FIRESTORE_EMULATOR_HOST", None)
+        env["FIREBASE_DISABLED"] = "1"
+    log = open(log_path, "w") if log_path else subprocess.DEVNULL
+    process = subprocess.Popen([sys.executable, api_path], env=env, stdout=log, stderr=subprocess.STDOUT,
+                               cwd=os.path.dirname(api_path))
+    if not wait_for_port(port, timeout=60):
+        process.terminate()
+        raise RuntimeError("API server did not start; rerun with --server-log to see why")
+    return process
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.worker_failures = []  # clients that died early (the real concurrency was lower)
+        self.lock = threading.Lock()
+
+    def add(self, endpoint, latency, ok):
+        with self.lock:
+            self.latencies[endpoint].append(latency)
+            if not ok:
+                self.errors[endpoint] += 1
+
+
+def run_load(base_url, mix, endpoint_weights, concurrency, duration, max_requests, seed):
+    recorder = Recorder()
+    endpoints = list(endpoint_weights)
+    weights = [endpoint_weights[e] for e in endpoints]
+    deadline = time.time() + duration
+    issued = [0]
+    issued_lock = threading.Lock()
+
+    def worker(worker_id):
+        rng = random.Random(seed * 1000 + worker_id)
+        session = requests.Session()
+        while time.time() < deadline:
+            with issued_lock:
+                if max_requests and issued[0] >= max_requests:
+                    return
+                issued[0] += 1
+            endpoint = rng.choices(endpoints, weights)[0]
+            payload, headers = rng.choice(mix)
+            start = time.perf_counter()
+            try:
+                if endpoint == "/api/movies":
+                    response = session.get(base_url + endpoint, timeout=30)
+                else:
+                    response = session.post(base_url + endpoint, json=payload, headers=headers, timeout=30)
+                # A context with no matching movies legitimately returns 404
+                ok = response.status_code < 400 or (endpoint == "/recommend" and response.status_code == 404)
+            except requests.RequestException:
+                ok = False
+            recorder.add(endpoint, time.perf_counter() - start, ok)
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(worker, worker_id) for worker_id in range(concurrency)]
+    for future in futures:
+        error = future.exception()
+        if error is not None:
+            recorder.worker_failures.append(f"{type(error).__name__}: {error}")
+    return recorder, time.time() - started
+
+
+def build_report(recorder, elapsed, args):
+    report = {"concurrency": args.concurrency, "elapsed_seconds": round(elapsed, 2), "endpoints": {}}
+    all_latencies = []
+    total_errors = 0
+    for endpoint, latencies in sorted(recorder.latencies.items()):
+        latencies.sort()
+        all_latencies.extend(latencies)
+        total_errors += recorder.errors[endpoint]
+        report["endpoints"][endpoint] = summarize(latencies, recorder.errors[endpoint], elapsed)
+    all_latencies.sort()
+    report["overall"] = summarize(all_latencies, total_errors, elapsed)
+    report["worker_failures"] = recorder.worker_failures
+    report["injected_latency_ms"] = {
+        "weather": args.weather_latency_ms,
+        "comprehend": args.comprehend_latency_ms,
+        "jitter": args.jitter_ms,
+    }
+    return report
+
+
+def summarize(latencies, errors, elapsed):
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def print_report(report):
+    print("\n📊 Load Test Results")
+    print("=" * 78)
+    print(f"{'endpoint':<20}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    rows = list(report["endpoints"].items()) + [("overall", report["overall"])]
+    for endpoint, s in rows:
+        print(f"{endpoint:<20}{s['requests']:>10}{s['errors']:>8}{s['throughput_rps']:>10}"
+              f"{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+    if "stub_requests" in report:
+        print(f"Upstream stub calls: {report['stub_requests']}")
+    if report["worker_failures"]:
+        print(f"⚠️ {len(report['worker_failures'])} of {report['concurrency']} clients died early, "
+              f"so the effective concurrency was lower: {report['worker_failures'][0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the recommendation API with local stubs")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20, help="seconds to drive load for")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many requests (0 = no limit)")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds of unrecorded warm-up load")
+    parser.add_argument("--users", type=int, default=500, help="distinct synthetic user ids")
+    parser.add_argument("--mix", default="/recommend=0.7,/generate-context=0.2,/api/movies=0.1",
+                        help="endpoint weights, e.g. /recommend=1,/api/movies=0")
+    parser.add_argument("--weather-latency-ms", type=float, default=0)
+    parser.add_argument("--comprehend-latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0, help="uniform extra latency added to both stubs")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub calls that fail")
+    parser.add_argument("--firestore-emulator", default=None,
+                        help="host:port of a running emulator; 'start' launches one via gcloud")
+    parser.add_argument("--target", default=None, help="drive an already running server instead")
+    parser.add_argument("--server-log", default=None, help="write the API server's output here")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", default=None, help="also write the report to this file")
+    args = parser.parse_args()
+
+    endpoint_weights = {}
+    for part in args.mix.split(","):
+        endpoint, weight = part.split("=")
+        endpoint_weights[endpoint.strip()] = float(weight)
+    mix = load_request_mix(args.users, args.seed)
+
+    stubs, processes = [], []
+    try:
+        if args.target:
+            base_url = args.target.rstrip("/")
+        else:
+            weather = StubServer("weather", args.weather_latency_ms, args.jitter_ms, args.error_rate).start()
+            comprehend = StubServer("comprehend", args.comprehend_latency_ms, args.jitter_ms, args.error_rate).start()
+            stubs = [weather, comprehend]
+            emulator_host = args.firestore_emulator
+            if emulator_host == "start":
+                emulator, emulator_host = start_firestore_emulator()
+                if emulator:
+                    processes.append(emulator)
+            port = free_port()
+            print(f"🚀 Starting API on port {port} (weather stub {weather.url}, comprehend stub {comprehend.url})")
+            processes.append(start_api(port, weather.url, comprehend.url, emulator_host, args.server_log))
+            base_url = f"http://127.0.0.1:{port}"
+
+        if args.warmup:
+            print(f"🔥 Warming up for {args.warmup:.0f}s...")
+            run_load(base_url, mix, endpoint_weights, args.concurrency, args.warmup, 0, args.seed + 1)
+        print(f"⏱️ Driving {args.concurrency} concurrent clients for up to {args.duration:.0f}s...")
+        recorder, elapsed = run_load(base_url, mix, endpoint_weights, args.concurrency,
+                                     args.duration, args.requests, args.seed)
+        report = build_report(recorder, elapsed, args)
+        if stubs:
+            report["stub_requests"] = {stub.kind: stub.requests for stub in stubs}
+        print_report(report)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"💾 Report written to {args.json}")
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait(timeout=10)
+        for stub in stubs:
+            stub.stop()
+    # Numbers from a run that lost clients understate the load; don't let them pass silently
+    sys.exit(1 if report["worker_failures"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Local stand-ins for the API's external dependencies.
+
+- StubServer("weather") answers wttr.in's `/<ip>?format=j1` shape. The weather
+  returned is chosen from the last octet of the IP so a client can pick the
+  weather of each request via X-Forwarded-For (see weather_ip()).
+- StubServer("comprehend") answers the AWS Comprehend DetectSentiment JSON
+  protocol with a keyword-based sentiment, so boto3 can be pointed at it with
+  COMPREHEND_ENDPOINT_URL.
+- start_firestore_emulator() launches the gcloud Firestore emulator.
+
+Both stub servers accept an injected latency (fixed + uniform jitter) and an
+error rate to simulate upstream incidents.
+"""
+
+import json
+import random
+import shutil
+import socket
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WEATHER_CONDITIONS = ["Sunny", "Rainy", "Cloudy", "Clear", "Partly cloudy", "Light rain"]
+
+POSITIVE_WORDS = ["good", "great", "happy", "amazing", "awesome", "fantastic", "excited", "love"]
+NEGATIVE_WORDS = ["bad", "sad", "terrible", "awful", "tired", "stressed", "angry", "upset"]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, host="127.0.0.1", timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def weather_ip(weather):
+    """A fake client IP whose last octet selects `weather` on the weather stub."""
+    return f"10.0.0.{WEATHER_CONDITIONS.index(weather) if weather in WEATHER_CONDITIONS else 0}"
+
+
+def keyword_sentiment(text):
+    text_lower = text.lower()
+    positive = sum(word in text_lower for word in POSITIVE_WORDS)
+    negative = sum(word in text_lower for word in NEGATIVE_WORDS)
+    if positive and negative:
+        return "MIXED"
+    if positive:
+        return "POSITIVE"
+    if negative:
+        return "NEGATIVE"
+    return "NEUTRAL"
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server_version = "LocalStub/1.0"
+
+    def log_message(self, format, *args):
+        pass  # keep the load test output readable
+
+    def _delay_or_fail(self):
+        stub = self.server.stub
+        delay = stub.latency_ms + random.uniform(0, stub.jitter_ms)
+        if delay:
+            time.sleep(delay / 1000)
+        stub.requests += 1
+        if stub.error_rate and random.random() < stub.error_rate:
+            self._send(503, {"message": "injected failure"})
+            return True
+        return False
+
+    def _send(self, status, payload, content_type="application/json"):
+        body = json.dumps(payload).encode("utf-8")
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the API gave up waiting (timeout), which is what latency injection is for
+
+    def do_GET(self):
+        if self.server.stub.kind != "weather" or self._delay_or_fail():
+            return
+        ip = self.path.lstrip("/").split("?")[0]
+        try:
+            weather = WEATHER_CONDITIONS[int(ip.rsplit(".", 1)[-1]) % len(WEATHER_CONDITIONS)]
+        except ValueError:
+            weather = "Sunny"
+        self._send(200, {"current_condition": [{"weatherDesc": [{"value": weather}]}]})
+
+    def do_POST(self):
+        if self.server.stub.kind != "comprehend" or self._delay_or_fail():
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        sentiment = keyword_sentiment(request.get("Text", ""))
+        scores = {name: 0.05 for name in ("Positive", "Negative", "Neutral", "Mixed")}
+        scores[sentiment.capitalize()] = 0.85
+        self._send(200, {"Sentiment": sentiment, "SentimentScore": scores},
+                   content_type="application/x-amz-json-1.1")
+
+
+class StubServer:
+    """A threaded HTTP stub for the "weather" or "comprehend" dependency."""
+
+    def __init__(self, kind, latency_ms=0, jitter_ms=0, error_rate=0.0, port=None):
+        self.kind = kind
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.port = port or free_port()
+        self.requests = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), _StubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def start_firestore_emulator(port=None):
+    """
+    Starts the gcloud Firestore emulator and returns (process, "host:port"),
+    or (None, None) if gcloud is not installed.
+    """
+    gcloud = shutil.which("gcloud")
+    if not gcloud:
+        print("⚠️ gcloud not found; running without the Firestore emulator.")
+        return None, None
+    port = port or free_port()
+    host_port = f"127.0.0.1:{port}"
+    process = subprocess.Popen(
+        [gcloud, "emulators", "firestore", "start", f"--host-port={host_port}"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    if not wait_for_port(port, timeout=60):
+        process.terminate()
+        print("⚠️ Firestore emulator did not start; running without it.")
+        return None, None
+    print(f"✅ Firestore emulator running on {host_port}")
+    return process, host_port
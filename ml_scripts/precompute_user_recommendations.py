@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Nightly Precompute Job
+
+Precomputes each returning user's recommendations for their last known
+context so the API can serve them without ranking at request time:
+
+1. streams the UserMoods collection (written by /generate-context) page by
+   page, reading only the `context` field, and groups user ids by context key
+2. ranks every distinct context once in a process pool, with the same scoring
+   recommend_movies uses for exploitation (backend/scoring.py), from the same
+   stats the API reads: the local JSON files, or the bandit_stats collection
+   with --stats-backend firestore (default: BANDIT_STATS_BACKEND)
+3. writes {context_key, titles, generated_at} per user to UserRecommendations
+   in batched writes (500 per batch) committed by a pool of writer threads
+
+Users whose context has a sub-intent (served by the API's strict sub-intent
+mode), anonymous ids and contexts with no bandit stats at any back-off level
+are skipped. The API only reads these lists when started with
+PRECOMPUTED_RECOMMENDATIONS=1 (each cache miss costs a synchronous Firestore
+read), and ignores a list once the user's context changes or it is older than
+PRECOMPUTED_MAX_AGE_HOURS.
+
+Runs against the Firestore emulator when FIRESTORE_EMULATOR_HOST is set;
+--seed-synthetic N fills the emulator's UserMoods with N fake users first.
+
+Usage:
+    python precompute_user_recommendations.py [--workers 8] [--writers 8] [--dry-run]
+    FIRESTORE_EMULATOR_HOST=127.0.0.1:8080 python precompute_user_recommendations.py --seed-synthetic 100000
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.join(script_dir, "../backend")
+sys.path.insert(0, backend_dir)
+
+from catalog import Catalog
+from firestore_stats import BANDIT_STATS_COLLECTION
+from firestore_utils import MAX_BATCH_WRITES, init_firestore
+from precomputed import USER_RECOMMENDATIONS_COLLECTION
+from scoring import context_to_key, rank_context
+from stats_store import StatsFileLoader, StatsStore
+from user_overlays import ANONYMOUS_USER_IDS
+
+USER_MOODS_COLLECTION = "UserMoods"
+BANDIT_STATS_PATH = os.path.join(script_dir, "../data/bandit_stats.json")
+COMPACT_STATS_PATH = os.path.join(script_dir, "../data/bandit_stats.compact.json")
+MOVIES_PATH = os.path.join(script_dir, "../data/movies.json")
+
+# Per-process state for the ranking pool
+_worker = {}
+
+
+# --- 1. Stream and group ---
+
+def group_users_by_context(db, page_size=5000, limit=None):
+    """
+    Returns ({context_key: [user_id, ...]}, {context_key: context}, skipped).
+    Pages through UserMoods by document id so a multi-million document scan
+    never depends on one long-lived stream.
+    """
+    groups = defaultdict(list)
+    contexts = {}
+    skipped = defaultdict(int)
+    seen = 0
+    last_doc = None
+    base_query = db.collection(USER_MOODS_COLLECTION).select(["context"]).order_by("__name__")
+    while True:
+        query = base_query.limit(page_size)
+        if last_doc is not None:
+            query = query.start_after(last_doc)
+        page = list(query.stream())
+        for doc in page:
+            context = (doc.to_dict() or {}).get("context") or {}
+            if doc.id in ANONYMOUS_USER_IDS:
+                skipped["anonymous"] += 1
+            elif not context.get("mood") or not context.get("intent"):
+                skipped["no_context"] += 1
+            elif context.get("sub_intent"):
+                skipped["sub_intent"] += 1
+            else:
+                key = context_to_key(context)
+                groups[key].append(doc.id)
+                contexts.setdefault(key, context)
+        seen += len(page)
+        if page:
+            print(f"   ...scanned {seen} users, {len(groups)} distinct contexts")
+        if len(page) < page_size or (limit and seen >= limit):
+            break
+        last_doc = page[-1]
+    return groups, contexts, dict(skipped)
+
+
+# --- 2. Rank each distinct context once ---
+
+def load_firestore_stats(db, collection=BANDIT_STATS_COLLECTION):
+    """{context_key: {title: {reward, count}}} from the collection BANDIT_STATS_BACKEND=firestore serves."""
+    contexts = {}
+    for doc in db.collection(collection).stream():
+        movies = {title: entry for title, entry in (doc.to_dict() or {}).items() if isinstance(entry, dict)}
+        if movies:
+            contexts[doc.id] = movies
+    print(f"✅ Loaded {len(contexts)} contexts from Firestore '{collection}'")
+    return contexts
+
+
+def _init_ranker(stats_paths, movies_path, half_life_days, max_arms, firestore_contexts=None):
+    if firestore_contexts is not None:
+        # Same as the API's Firestore backend: plain counters, no decay or arm budget
+        _worker["stats"] = StatsStore(firestore_contexts) if firestore_contexts else None
+    else:
+        loader = StatsFileLoader(*stats_paths, half_life_seconds=half_life_days * 86400 or None,
+                                 max_arms=max_arms or None)
+        _worker["stats"] = loader.get()
+    _worker["catalog"] = Catalog(movies_path)
+
+
+def _rank(item):
+    context_key, context = item
+    stats_store = _worker["stats"]
+    if stats_store is None:
+        return context_key, []
+    return context_key, rank_context(stats_store, _worker["catalog"], context_key, context)
+
+
+def rank_contexts(contexts, workers, stats_paths, movies_path, half_life_days, max_arms, firestore_contexts=None):
+    """{context_key: [title, ...]} for every context that has stats to rank from."""
+    ranked = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_ranker,
+                             initargs=(stats_paths, movies_path, half_life_days, max_arms, firestore_contexts)) as pool:
+        chunksize = max(1, len(contexts) // (workers * 4))
+        for context_key, titles in pool.map(_rank, contexts.items(), chunksize=chunksize):
+            if titles:
+                ranked[context_key] = titles
+    return ranked
+
+
+# --- 3. Batched writes ---
+
+def _commit(batch, size, retries=3):
+    for attempt in range(retries):
+        try:
+            batch.commit()
+            return size
+        except Exception as e:
+            if attempt == retries - 1:
+                print(f"❌ Firestore Error: batch of {size} writes failed: {e}")
+                return 0
+            time.sleep(2 ** attempt)
+
+
+def write_recommendations(db, groups, ranked, writers, collection=USER_RECOMMENDATIONS_COLLECTION):
+    """Writes one document per user; returns the number of documents written."""
+    generated_at = datetime.now(timezone.utc)
+    in_flight = threading.BoundedSemaphore(writers * 2)  # cap queued batches (and memory)
+    futures = []
+
+    def submit(pool, batch, size):
+        in_flight.acquire()
+        future = pool.submit(_commit, batch, size)
+        future.add_done_callback(lambda _: in_flight.release())
+        futures.append(future)
+
+    with ThreadPoolExecutor(max_workers=writers) as pool:
+        batch, size = db.batch(), 0
+        for context_key, titles in ranked.items():
+            doc = {"context_key": context_key, "titles": titles, "generated_at": generated_at}
+            for user_id in groups[context_key]:
+                batch.set(db.collection(collection).document(user_id), doc)
+                size += 1
+                if size == MAX_BATCH_WRITES:
+                    submit(pool, batch, size)
+                    batch, size = db.batch(), 0
+        if size:
+            submit(pool, batch, size)
+    return sum(future.result() for future in futures)
+
+
+# --- Emulator seeding ---
+
+def seed_synthetic_users(db, count, stats_paths):
+    """Fills UserMoods with `count` fake users whose contexts come from the bandit stats."""
+    if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        print("❌ --seed-synthetic only runs against the Firestore emulator.")
+        sys.exit(1)
+    stats = StatsFileLoader(*stats_paths).get()
+    keys = [key for key in (stats.snapshot().contexts if stats else {}) if key.count("|") == 4] or ["Positive|Entertainment||Sunny|Evening"]
+    rng = random.Random(42)
+    batch, size = db.batch(), 0
+    for i in range(count):
+        mood, intent, sub_intent, weather, time_of_day = rng.choice(keys).split("|")
+        context = {"mood": mood, "intent": intent, "weather": weather, "time_of_day": time_of_day}
+        if sub_intent:
+            context["sub_intent"] = sub_intent
+        batch.set(db.collection(USER_MOODS_COLLECTION).document(f"synthetic-user-{i:08d}"),
+                  {"context": context, "timestamp": datetime.now()})
+        size += 1
+        if size == MAX_BATCH_WRITES:
+            batch.commit()
+            batch, size = db.batch(), 0
+    if size:
+        batch.commit()
+    print(f"🌱 Seeded {count} synthetic users into {USER_MOODS_COLLECTION}")
+
+
+def run(db, workers=None, writers=8, page_size=5000, limit=None, dry_run=False,
+        stats_paths=(COMPACT_STATS_PATH, BANDIT_STATS_PATH), movies_path=MOVIES_PATH,
+        half_life_days=30.0, max_arms=200000, stats_backend="file"):
+    """Runs the whole job; returns a summary dict."""
+    workers = workers or os.cpu_count() or 1
+    started = time.time()
+
+    print("📥 Streaming UserMoods...")
+    groups, contexts, skipped = group_users_by_context(db, page_size=page_size, limit=limit)
+    users = sum(len(ids) for ids in groups.values())
+    print(f"✅ {users} users across {len(groups)} distinct contexts (skipped: {skipped or 'none'})")
+
+    firestore_contexts = load_firestore_stats(db) if stats_backend == "firestore" else None
+    print(f"🧮 Ranking {len(contexts)} contexts with {workers} worker process(es)...")
+    ranked = rank_contexts(contexts, workers, stats_paths, movies_path, half_life_days, max_arms, firestore_contexts)
+    unranked = [key for key in groups if key not in ranked]
+    print(f"✅ Ranked {len(ranked)} contexts ({len(unranked)} without stats)")
+
+    written = 0
+    if dry_run:
+        print("🔎 Dry run: nothing written.")
+    else:
+        print(f"📤 Writing per-user lists with {writers} writer thread(s)...")
+        written = write_recommendations(db, groups, ranked, writers)
+        print(f"✅ Wrote {written} documents to {USER_RECOMMENDATIONS_COLLECTION}")
+
+    summary = {
+        "users": users,
+        "contexts": len(groups),
+        "ranked_contexts": len(ranked),
+        "written": written,
+        "skipped": skipped,
+        "seconds": round(time.time() - started, 1),
+    }
+    print(f"🎉 Done in {summary['seconds']}s")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute per-user recommendations for returning users")
+    parser.add_argument("--workers", type=int, default=None, help="ranking processes (default: CPU count)")
+    parser.add_argument("--writers", type=int, default=8, help="threads committing write batches")
+    parser.add_argument("--page-size", type=int, default=5000, help="UserMoods documents per read page")
+    parser.add_argument("--limit", type=int, default=None, help="stop after roughly this many users")
+    parser.add_argument("--dry-run", action="store_true", help="rank but do not write")
+    parser.add_argument("--seed-synthetic", type=int, default=0, metavar="N",
+                        help="seed N synthetic UserMoods documents first (emulator only)")
+    parser.add_argument("--half-life-days", type=float, default=float(os.getenv("BANDIT_HALF_LIFE_DAYS", "30")))
+    parser.add_argument("--max-arms", type=int, default=int(os.getenv("BANDIT_MAX_ARMS", "200000")))
+    parser.add_argument("--stats-backend", choices=("file", "firestore"),
+                        default=os.getenv("BANDIT_STATS_BACKEND", "file"),
+                        help="rank from the local JSON stats or the bandit_stats collection")
+    args = parser.parse_args()
+
+    db = init_firestore()
+    stats_paths = (COMPACT_STATS_PATH, BANDIT_STATS_PATH)
+    if args.seed_synthetic:
+        seed_synthetic_users(db, args.seed_synthetic, stats_paths)
+    run(db, workers=args.workers, writers=args.writers, page_size=args.page_size, limit=args.limit,
+        dry_run=args.dry_run, stats_paths=stats_paths,
+        half_life_days=args.half_life_days, max_arms=args.max_arms, stats_backend=args.stats_backend)
+
+
+if __name__ == "__main__":
+    main()
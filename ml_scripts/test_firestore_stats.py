@@ -0,0 +1,62 @@
+"""
+Checks the Firestore-backed bandit stats against the Firestore emulator.
+
+Two FirestoreStatsBackend instances stand in for two API servers. Feedback
+recorded on one must show up in the other's local cache within a few seconds,
+and the batched increments must add up exactly in the stored documents.
+
+Usage:
+    gcloud emulators firestore start --host-port=127.0.0.1:8080
+    FIRESTORE_EMULATOR_HOST=127.0.0.1:8080 python test_firestore_stats.py
+"""
+
+import time
+
+from emulator_checks import check, clear_collection, emulator_client, finish, wait_until
+from firestore_stats import FirestoreStatsBackend
+
+COLLECTION = "bandit_stats_test"
+CONTEXT_KEY = "Positive|Entertainment||Sunny|Evening"
+
+
+def main():
+    db = emulator_client()
+    clear_collection(db, COLLECTION)
+    db.collection(COLLECTION).document(CONTEXT_KEY).set({"Inside Out 2": {"reward": 2, "count": 3}})
+
+    instance_a = FirestoreStatsBackend(db, collection=COLLECTION, flush_interval=0.2).start()
+    instance_b = FirestoreStatsBackend(db, collection=COLLECTION, flush_interval=0.2).start()
+    failures = 0
+    try:
+        # 1. Initial sync through the snapshot listener
+        synced = wait_until(lambda: instance_b.lookup(CONTEXT_KEY)[0].get("Inside Out 2"))
+        failures += check("Initial sync", synced)
+
+        # 2. Feedback on A converges to B
+        for _ in range(50):
+            instance_a.record(CONTEXT_KEY, "Inside Out 2", 1)
+        instance_a.record(CONTEXT_KEY, "Wicked", 1)
+        start = time.time()
+        converged = wait_until(lambda: instance_b.lookup(CONTEXT_KEY)[0].get("Inside Out 2", {}).get("count") == 53
+                               and "Wicked" in instance_b.lookup(CONTEXT_KEY)[0])
+        failures += check(f"Convergence A -> B ({time.time() - start:.2f}s)", converged)
+
+        # 3. Batched increments add up exactly in Firestore
+        stored = db.collection(COLLECTION).document(CONTEXT_KEY).get().to_dict()
+        exact = stored["Inside Out 2"] == {"reward": 52, "count": 53} and stored["Wicked"]["count"] == 1
+        failures += check("Stored counters", exact, stored)
+
+        # 4. Unknown contexts back off to the rollups
+        stats, level = instance_b.lookup("Positive|Entertainment||Rainy|Night")
+        backed_off = level == "mood_intent" and "Inside Out 2" in stats
+        failures += check("Back-off for unseen context", backed_off, level)
+    finally:
+        instance_a.stop()
+        instance_b.stop()
+        clear_collection(db, COLLECTION)
+
+    finish(failures)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Checks the nightly precompute job against the Firestore emulator.
+
+Seeds UserMoods with a handful of users, runs the job, and checks that every
+eligible user got a list, that skipped users did not, and that the API-side
+PrecomputedStore serves a list only while the context key still matches.
+
+Usage:
+    gcloud emulators firestore start --host-port=127.0.0.1:8080
+    FIRESTORE_EMULATOR_HOST=127.0.0.1:8080 python test_precompute_recommendations.py
+"""
+
+from emulator_checks import check, clear_collection, emulator_client, finish
+import precompute_user_recommendations as job
+from precomputed import PrecomputedStore, USER_RECOMMENDATIONS_COLLECTION
+from scoring import context_to_key
+
+EVENING = {"mood": "Positive", "intent": "Entertainment", "weather": "Sunny", "time_of_day": "Evening"}
+NIGHT = {"mood": "Negative", "intent": "Relaxation", "weather": "Rainy", "time_of_day": "Night"}
+WORKOUT = {"mood": "Positive", "intent": "Focus", "sub_intent": "Workout", "weather": "Sunny", "time_of_day": "Morning"}
+
+
+def main():
+    db = emulator_client()
+    for name in (job.USER_MOODS_COLLECTION, USER_RECOMMENDATIONS_COLLECTION):
+        clear_collection(db, name)
+    users = {"user-a": EVENING, "user-b": EVENING, "user-c": NIGHT, "user-d": WORKOUT, "guest": EVENING}
+    for user_id, context in users.items():
+        db.collection(job.USER_MOODS_COLLECTION).document(user_id).set({"context": context})
+
+    failures = 0
+    try:
+        # Small pages so pagination is exercised
+        summary = job.run(db, workers=2, writers=2, page_size=2)
+        stored = {doc.id: doc.to_dict() for doc in db.collection(USER_RECOMMENDATIONS_COLLECTION).stream()}
+
+        # 1. Eligible users get lists; sub-intent and anonymous users do not
+        expected = {"user-a", "user-b", "user-c"}
+        ok = set(stored) == expected and all(len(doc["titles"]) == 10 for doc in stored.values())
+        failures += check("Per-user lists written", ok, sorted(stored))
+
+        # 2. Users sharing a context share one ranking
+        ok = stored["user-a"]["titles"] == stored["user-b"]["titles"] and summary["contexts"] == 2
+        failures += check("One ranking per context", ok, summary)
+
+        # 3. The API serves a list only for the context it was built for
+        store = PrecomputedStore(db=db)
+        ok = store.get("user-a", context_to_key(EVENING)) == stored["user-a"]["titles"] \
+            and store.get("user-a", context_to_key(NIGHT)) is None
+        failures += check("Served only while the context matches", ok)
+    finally:
+        for name in (job.USER_MOODS_COLLECTION, USER_RECOMMENDATIONS_COLLECTION):
+            clear_collection(db, name)
+
+    finish(failures)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Stress test for the read-copy-update bandit stats (SnapshotStats).
+
+1. Counter correctness: writer threads record a known number of increments
+   while reader threads keep scoring contexts. After the final merge every
+   context, and the global rollup, must hold exactly the recorded totals, and
+   no reader may ever see a count go backwards or hit a half-updated bucket.
+2. Read throughput: lookups per second with 1, 2, 4, 8... reader threads
+   while a writer keeps recording, for SnapshotStats and for the same store
+   behind one global lock (the approach it replaces).
+
+Usage:
+    python test_stats_concurrency.py [--writers 8] [--increments 20000] [--seconds 2]
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../backend"))
+
+from stats_store import SnapshotStats, StatsStore
+
+MOODS = ["Positive", "Negative", "Neutral", "Mixed"]
+INTENTS = ["Entertainment", "Relaxation", "Focus"]
+WEATHERS = ["Sunny", "Rainy", "Cloudy"]
+TIMES = ["Morning", "Afternoon", "Evening", "Night"]
+TITLES = [f"Movie {i}" for i in range(60)]
+CONTEXT_KEYS = [f"{m}|{i}||{w}|{t}" for m in MOODS for i in INTENTS for w in WEATHERS for t in TIMES]
+
+
+def seeded_store():
+    contexts = {key: {title: {"reward": 1, "count": 2} for title in random.sample(TITLES, 20)}
+                for key in CONTEXT_KEYS}
+    return StatsStore(contexts)
+
+
+def total_count(store, context_key):
+    return sum(entry["count"] for entry in store.peek(context_key)[0].values())
+
+
+def check_counters(writers, increments, readers):
+    random.seed(7)
+    base = seeded_store()
+    stats = SnapshotStats(base, merge_interval=0.01)
+    expected = {key: total_count(base, key) for key in CONTEXT_KEYS}
+    expected_global = sum(expected.values())
+    plans = [[(random.choice(CONTEXT_KEYS), random.choice(TITLES)) for _ in range(increments)]
+             for _ in range(writers)]
+    for plan in plans:
+        for key, _ in plan:
+            expected[key] += 1
+
+    stop = threading.Event()
+    problems = []
+
+    def reader():
+        last_seen = {}
+        while not stop.is_set():
+            key = random.choice(CONTEXT_KEYS)
+            try:
+                bucket, _ = stats.lookup(key)
+                count = sum(entry["count"] for entry in bucket.values())
+            except RuntimeError as e:  # e.g. "dictionary changed size during iteration"
+                problems.append(str(e))
+                return
+            if count < last_seen.get(key, 0):
+                problems.append(f"{key} went backwards: {last_seen[key]} -> {count}")
+                return
+            last_seen[key] = count
+
+    def writer(plan):
+        for key, title in plan:
+            stats.record(key, title, 1)
+
+    reader_threads = [threading.Thread(target=reader) for _ in range(readers)]
+    writer_threads = [threading.Thread(target=writer, args=(plan,)) for plan in plans]
+    for thread in reader_threads + writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    stop.set()
+    for thread in reader_threads:
+        thread.join()
+    stats.stop()
+
+    snapshot = stats.snapshot()
+    wrong = [key for key in CONTEXT_KEYS if total_count(snapshot, key) != expected[key]]
+    global_total = sum(entry["count"] for entry in snapshot.rollups["global"][""].values())
+    expected_global += writers * increments
+    base_untouched = all(total_count(base, key) == 20 * 2 for key in CONTEXT_KEYS)
+
+    ok = not wrong and not problems and global_total == expected_global and base_untouched
+    print(f"Counter correctness ({writers} writers x {increments} increments, {readers} readers, "
+          f"{stats.merges} merges): {'✅' if ok else '❌'}")
+    if wrong:
+        print(f"   wrong totals for {len(wrong)} contexts, e.g. {wrong[0]}")
+    if problems:
+        print(f"   reader problem: {problems[0]}")
+    if global_total != expected_global:
+        print(f"   global rollup {global_total} != {expected_global}")
+    if not base_untouched:
+        print("   the original snapshot was modified")
+    return ok
+
+
+class LockedStats:
+    """Baseline: the plain store behind one global lock."""
+
+    def __init__(self, store):
+        self.store = store
+        self.lock = threading.Lock()
+
+    def lookup(self, context_key):
+        with self.lock:
+            stats, level = self.store.lookup(context_key)
+            return dict(stats), level
+
+    def record(self, context_key, title, reward, count=1):
+        with self.lock:
+            self.store.record(context_key, title, reward, count)
+
+    def stop(self):
+        pass
+
+
+def read_throughput(make_stats, threads, seconds):
+    stats = make_stats()
+    stop = threading.Event()
+    counts = [0] * threads
+
+    def reader(n):
+        rng = random.Random(n)
+        while not stop.is_set():
+            bucket, _ = stats.lookup(rng.choice(CONTEXT_KEYS))
+            max(bucket.values(), key=lambda entry: entry["reward"] / max(entry["count"], 1))
+            counts[n] += 1
+
+    def writer():
+        rng = random.Random(-1)
+        while not stop.is_set():
+            stats.record(rng.choice(CONTEXT_KEYS), rng.choice(TITLES), 1)
+            time.sleep(0.0005)
+
+    workers = [threading.Thread(target=reader, args=(n,)) for n in range(threads)]
+    workers.append(threading.Thread(target=writer))
+    for worker in workers:
+        worker.start()
+    time.sleep(seconds)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    stats.stop()
+    return sum(counts) / seconds
+
+
+def check_throughput(max_threads, seconds):
+    print("\nRead throughput with a concurrent writer (lookups/s):")
+    print(f"{'threads':>8}{'snapshot':>14}{'global lock':>14}")
+    results = {}
+    threads = 1
+    while threads <= max_threads:
+        snapshot_rate = read_throughput(lambda: SnapshotStats(seeded_store(), merge_interval=0.05), threads, seconds)
+        locked_rate = read_throughput(lambda: LockedStats(seeded_store()), threads, seconds)
+        results[threads] = snapshot_rate
+        print(f"{threads:>8}{snapshot_rate:>14,.0f}{locked_rate:>14,.0f}")
+        threads *= 2
+
+    # Readers never wait on each other or on the writer, so adding threads must not
+    # collapse total throughput (under the GIL it stays roughly flat; without it, it scales)
+    ok = min(results.values()) >= 0.5 * results[1]
+    print(f"No collapse as readers are added: {'✅' if ok else '❌'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress test SnapshotStats")
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--increments", type=int, default=20000, help="increments per writer")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--max-threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=2.0, help="duration of each throughput run")
+    args = parser.parse_args()
+
+    failures = 0
+    failures += not check_counters(args.writers, args.increments, args.readers)
+    failures += not check_throughput(args.max_threads, args.seconds)
+    print("\n🎉 All checks passed!" if not failures else f"\n❌ {failures} check(s) failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
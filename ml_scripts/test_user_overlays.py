@@ -0,0 +1,77 @@
+"""
+Checks the per-user overlay store against the Firestore emulator.
+
+Covers eviction (capacity and TTL), background write-back as Increment merges,
+lazy reload of evicted users, and that a failed load never overwrites the
+history stored in Firestore.
+
+Usage:
+    gcloud emulators firestore start --host-port=127.0.0.1:8080
+    FIRESTORE_EMULATOR_HOST=127.0.0.1:8080 python test_user_overlays.py
+"""
+
+import time
+
+from emulator_checks import check, clear_collection, emulator_client, finish, wait_until
+from circuit_breaker import CLOSED, OPEN, CircuitBreaker
+from user_overlays import UserOverlayStore
+
+COLLECTION = "UserOverlays_test"
+
+
+def stored_titles(db, user_id):
+    snapshot = db.collection(COLLECTION).document(user_id).get()
+    return (snapshot.to_dict() or {}).get("titles", {}) if snapshot.exists else {}
+
+
+def main():
+    db = emulator_client()
+    clear_collection(db, COLLECTION)
+    failures = 0
+    try:
+        # 1. Capacity eviction + background write-back
+        store = UserOverlayStore(db=db, capacity=2, collection=COLLECTION, flush_interval=0.2)
+        for user_id in ("user-a", "user-b", "user-c"):
+            store.record(user_id, "Inside Out 2", 1)
+        evicted = "user-a" not in store._overlays and store.info()["evictions"] >= 1
+        written = wait_until(lambda: stored_titles(db, "user-a").get("Inside Out 2", {}).get("count") == 1)
+        failures += check("Eviction + background write-back", evicted and written)
+
+        # 2. Evicted user reloads from Firestore and keeps accumulating
+        reloaded = store.get("user-a").get("Inside Out 2") == [1.0, 1]
+        store.record("user-a", "Inside Out 2", 0)
+        store.flush()
+        stored = stored_titles(db, "user-a")["Inside Out 2"]
+        ok = reloaded and stored == {"reward": 1, "count": 2}
+        failures += check("Reload after eviction", ok, stored)
+        store.stop()
+
+        # 3. TTL eviction
+        store = UserOverlayStore(db=db, capacity=100, ttl_seconds=0.2, collection=COLLECTION)
+        store.get("user-ttl")
+        time.sleep(0.3)
+        store.get("user-other")
+        ok = "user-ttl" not in store._overlays
+        failures += check("TTL eviction", ok)
+
+        # 4. A failed load never overwrites stored history
+        db.collection(COLLECTION).document("user-history").set(
+            {"titles": {f"Movie {i}": {"reward": 1, "count": 2} for i in range(30)}})
+        breaker = CircuitBreaker("firestore")
+        breaker.state, breaker._opened_at = OPEN, time.monotonic()
+        store = UserOverlayStore(db=db, capacity=1, collection=COLLECTION, breaker=breaker)
+        store.record("user-history", "Movie 0", 1)
+        store.record("user-other", "Movie 0", 1)  # evicts user-history
+        breaker.state = CLOSED
+        store.flush()
+        titles = stored_titles(db, "user-history")
+        ok = len(titles) == 30 and titles["Movie 0"] == {"reward": 2, "count": 3}
+        failures += check("Failed load keeps stored history", ok, f"{len(titles)} titles")
+    finally:
+        clear_collection(db, COLLECTION)
+
+    finish(failures)
+
+
+if __name__ == "__main__":
+    main()